@@ -0,0 +1,91 @@
+"""Throughput of the service under 50 / 200 / 1000 concurrent clients.
+
+Start a local mongod and the service in debug mode (see debug.sh), then run:
+
+    python _dev/benchmarks/concurrency_benchmark.py --url http://127.0.0.1:8000
+
+Every client loops on a read-heavy mix (publication by id, user publications, recent publications) for
+`--duration` seconds. One JSON line is printed per concurrency level, so runs on two commits can be diffed.
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+import httpx
+
+CONCURRENCY_LEVELS = (50, 200, 1000)
+SEED_PUBLICATIONS = 200
+
+
+async def seed(client: httpx.AsyncClient) -> list[str]:
+    ids = []
+    for i in range(SEED_PUBLICATIONS):
+        res = await client.post("/post_publication", json={
+            "publication_name": f"bench {i}",
+            "user_name": f"bench_user_{i % 20}",
+            "description": "benchmark publication #bench",
+            "media_url": "/api/images/000000000000000000000000",
+            "content_type": "image",
+            "category": "photography"
+        })
+        ids.append(res.json()["publication_id"])
+    return ids
+
+
+def pick_request(ids: list[str]) -> str:
+    roll = random.random()
+    if roll < 0.6:
+        return f"/get_publication_by_id/{random.choice(ids)}"
+    elif roll < 0.9:
+        return f"/get_publications_of_user/bench_user_{random.randrange(20)}"
+    else:
+        return "/get_recent_publications?hours_time_delta=1"
+
+
+async def worker(client: httpx.AsyncClient, ids: list[str], deadline: float, latencies: list, errors: list):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            res = await client.get(pick_request(ids))
+            if res.status_code >= 500:
+                errors.append(res.status_code)
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+        latencies.append(time.perf_counter() - start)
+
+
+async def run_level(url: str, ids: list[str], concurrency: int, duration: float) -> dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    latencies, errors = [], []
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*(worker(client, ids, deadline, latencies, errors) for _ in range(concurrency)))
+    latencies.sort()
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "throughput_rps": round(len(latencies) / duration, 1),
+        "p50_ms": round(quantiles[49] * 1000, 2),
+        "p99_ms": round(quantiles[98] * 1000, 2)
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--duration", type=float, default=15.0)
+    args = parser.parse_args()
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=60) as client:
+        ids = await seed(client)
+    for concurrency in CONCURRENCY_LEVELS:
+        print(json.dumps(await run_level(args.url, ids, concurrency, args.duration)), flush=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
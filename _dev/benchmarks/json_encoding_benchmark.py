@@ -0,0 +1,115 @@
+"""Response encoding: former stringify + jsonable_encoder + JSONResponse path versus utils.MongoJSONResponse.
+
+No database needed. Run from the repository root:
+
+    python _dev/benchmarks/json_encoding_benchmark.py
+
+Documents are utils.publication_example / utils.comment_example with real ObjectId and datetime
+values, scaled to COMMENTS comments. One JSON line is printed per (document, implementation).
+"""
+import copy
+import datetime
+import json
+import os
+import statistics
+import sys
+import time
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "src"))
+
+import utils  # noqa: E402
+
+COMMENTS = 1_000
+REPLIES_PER_COMMENT = 1
+RUNS = 50
+
+
+def legacy_stringify_ids(publication: dict) -> dict:
+    """utils.stringify_ids before MongoJSONResponse, for publications with an embedded thread"""
+    publication['_id'] = str(publication['_id'])
+    for x in range(len(publication.get("comments", []))):
+        publication['comments'][x]['_id'] = str(
+            publication['comments'][x]['_id'])
+        for y in range(len(publication['comments'][x]['replies'])):
+            publication['comments'][x]['replies'][y]['_id'] = str(
+                publication['comments'][x]['replies'][y]['_id'])
+    return publication
+
+
+def legacy_stringify_comment(comment: dict) -> dict:
+    """utils.stringify_comment before MongoJSONResponse"""
+    comment['_id'] = str(comment['_id'])
+    comment['publication_id'] = str(comment['publication_id'])
+    if comment['parent_id'] is not None:
+        comment['parent_id'] = str(comment['parent_id'])
+    return comment
+
+
+def as_document(example: dict, **fields) -> dict:
+    """Turn an example of the OpenAPI docs into what pymongo returns"""
+    return {**example, "_id": ObjectId(), "publication_date": datetime.datetime.now(), **fields}
+
+
+def embedded_publication() -> dict:
+    """A publication in the pre-migration shape: the whole thread embedded"""
+    publication = as_document(utils.publication_example, comments_count=COMMENTS)
+    publication["comments"] = []
+    for _ in range(COMMENTS):
+        comment = as_document(utils.comment_example)
+        comment["replies"] = [as_document(utils.reply_example) for _ in range(REPLIES_PER_COMMENT)]
+        for document in [comment, *comment["replies"]]:  # embedded documents had no back references
+            del document["publication_id"], document["parent_id"]
+        publication["comments"].append(comment)
+    return publication
+
+
+def comments_page() -> list[dict]:
+    """A /get_comments page of COMMENTS comments from the comments collection"""
+    publication_id = ObjectId()
+    return [as_document(utils.comment_example, publication_id=publication_id) for _ in range(COMMENTS)]
+
+
+def legacy_publication(publication: dict) -> bytes:
+    return JSONResponse(jsonable_encoder({"publication": legacy_stringify_ids(publication)})).body
+
+
+def legacy_comments(comments: list[dict]) -> bytes:
+    content = {"comments": [legacy_stringify_comment(comment) for comment in comments], "next_cursor": None}
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def measure(func, document) -> dict:
+    timings = []
+    size = 0
+    for _ in range(RUNS):
+        fresh = copy.deepcopy(document)  # the legacy path stringifies in place
+        start = time.perf_counter()
+        size = len(func(fresh))
+        timings.append(time.perf_counter() - start)
+    return {"bytes": size, "median_ms": round(statistics.median(timings) * 1000, 3),
+            "min_ms": round(min(timings) * 1000, 3)}
+
+
+def main():
+    documents = {
+        "embedded_publication": (embedded_publication(), {
+            "legacy": legacy_publication,
+            "mongo_json_response": lambda p: utils.MongoJSONResponse({"publication": p}).body,
+        }),
+        "comments_page": (comments_page(), {
+            "legacy": legacy_comments,
+            "mongo_json_response": lambda c: utils.MongoJSONResponse({"comments": c, "next_cursor": None}).body,
+        }),
+    }
+    for document_name, (document, implementations) in documents.items():
+        for name, func in implementations.items():
+            print(json.dumps({"document": document_name, "comments": COMMENTS, "implementation": name,
+                              **measure(func, document)}), flush=True)
+
+
+if __name__ == "__main__":
+    main()
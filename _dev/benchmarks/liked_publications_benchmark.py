@@ -0,0 +1,93 @@
+"""Liked publications lookup: former N+1 loop versus the single aggregation of DBInterface.get_liked_pub.
+
+Needs a local mongod on 127.0.0.1:27017. Run from the repository root:
+
+    python _dev/benchmarks/liked_publications_benchmark.py
+
+Data is written to a throwaway "publications-bench" database, dropped afterwards.
+One JSON line is printed per (likes per user, implementation).
+"""
+import json
+import os
+import statistics
+import sys
+import time
+
+from bson import ObjectId
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "src"))
+os.environ.setdefault("DEPLOYMENT_MODE", "DEBUG")
+
+from classes.database_interface import DBInterface  # noqa: E402
+from classes import index_manager  # noqa: E402
+import utils  # noqa: E402
+
+LIKES_PER_USER = (10, 1_000, 10_000)
+RUNS = 5
+USER = "bench_user"
+BENCH_DATABASE = "publications-bench"
+
+
+def legacy_get_liked_pub(db: DBInterface, user: str) -> list[dict]:
+    """get_liked_pub before the aggregation: one find_one per liked publication."""
+    pub_list = []
+    for doc in db.database["pub_like_map"].find({"user_list": user}):
+        pub_list.append(db.collection.find_one({"_id": doc["_id"]}))
+    return pub_list
+
+
+def seed(db: DBInterface, likes: int) -> None:
+    db.collection.delete_many({})
+    db.database["pub_like_map"].delete_many({})
+    publications = []
+    for i in range(likes):
+        publication = utils.build_publication({
+            "publication_name": f"bench {i}",
+            "user_name": f"author_{i % 100}",
+            "description": "benchmark #bench",
+            "media_url": f"/api/images/{ObjectId()}",
+            "content_type": "image",
+            "category": "photography"
+        })
+        publication["comments"] = [utils.build_comment({"user": "commenter", "content": "nice"}) for _ in range(5)]
+        publications.append(publication)
+    db.collection.insert_many(publications)
+    db.database["pub_like_map"].insert_many([
+        {"_id": publication["_id"], "file_id": publication["media_url"].split("/")[3], "user_list": [USER, "other"]}
+        for publication in publications
+    ])
+
+
+def measure(func) -> dict:
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        count = len(func())
+        timings.append(time.perf_counter() - start)
+    return {"returned": count, "median_ms": round(statistics.median(timings) * 1000, 2),
+            "min_ms": round(min(timings) * 1000, 2)}
+
+
+def main():
+    db = DBInterface()
+    db.database = db.client[BENCH_DATABASE]
+    db.collection = db.database["publications"]
+    index_manager.apply_indexes(db)
+    try:
+        for likes in LIKES_PER_USER:
+            seed(db, likes)
+            implementations = {
+                "legacy_n_plus_1": lambda: legacy_get_liked_pub(db, USER),
+                "aggregation_all": lambda: list(db.get_liked_pub(USER)),
+                "aggregation_page_50": lambda: list(db.get_liked_pub(USER, limit=50)),
+                "aggregation_page_50_likes_only": lambda: list(
+                    db.get_liked_pub(USER, projection={"likes_count": 1}, limit=50)),
+            }
+            for name, func in implementations.items():
+                print(json.dumps({"likes_per_user": likes, "implementation": name, **measure(func)}), flush=True)
+    finally:
+        db.client.drop_database(BENCH_DATABASE)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+"""Reproducible load benchmark: throughput and p50/p95/p99 per endpoint, as JSON, to compare commits.
+
+Starts the stub TrendTracker and NFT services and the app (serve_app.py) on free local ports,
+seeds publications, comments and images, then runs `--concurrency` closed-loop clients on a fixed
+mix of requests (MIX) for `--duration` seconds after a `--warmup`. Run from the repository root:
+
+    python _dev/benchmarks/load_benchmark.py --output before.json                  # local mongod
+    python _dev/benchmarks/load_benchmark.py --backend mongomock --output after.json --baseline before.json
+    python _dev/benchmarks/load_benchmark.py --url http://127.0.0.1:8000            # already running service
+
+Requests are drawn from seeded random generators, so two runs send the same sequence per client.
+Only compare results of the same backend and machine: mongomock serializes every DB call.
+The micro-benchmarks of single code paths live next to this file (json_encoding_benchmark.py, ...).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+DEV_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# relative weight of every operation of the mix
+MIX = {
+    "post_publication": 5,
+    "post_comment": 5,
+    "vote": 15,
+    "get_by_id": 30,
+    "user_feed": 15,
+    "recent": 10,
+    "trendtracker_batch": 10,
+    "new_best": 5,
+    "image_download": 10,
+}
+
+USERS = 20
+VOTERS = 1000
+SEED_PUBLICATIONS = 200
+SEED_IMAGES = 20
+IMAGE_SIZE = 256 * 1024
+TRENDTRACKER_BATCH = 50
+
+
+def publication(rng: random.Random) -> dict:
+    return {
+        "publication_name": f"bench {rng.randrange(10 ** 6)}",
+        "user_name": f"bench_user_{rng.randrange(USERS)}",
+        "description": "benchmark publication #bench #load",
+        "media_url": "/api/images/000000000000000000000000",
+        "content_type": "image",
+        "category": "photography"
+    }
+
+
+class State:
+    """Ids the requests of the mix pick from; posts made during the run are added to them"""
+
+    def __init__(self):
+        self.publication_ids: list[str] = []
+        self.image_ids: list[str] = []
+
+
+async def post_publication(client: httpx.AsyncClient, rng: random.Random, state: State) -> httpx.Response:
+    res = await client.post("/post_publication", json=publication(rng))
+    if res.status_code == 201:
+        state.publication_ids.append(res.json()["publication_id"])
+    return res
+
+
+async def post_comment(client: httpx.AsyncClient, rng: random.Random, state: State) -> httpx.Response:
+    return await client.post(f"/post_comment/{rng.choice(state.publication_ids)}",
+                             json={"user": f"bench_user_{rng.randrange(USERS)}", "content": "nice #bench"})
+
+
+async def vote(client: httpx.AsyncClient, rng: random.Random, state: State) -> httpx.Response:
+    action = "upvote" if rng.random() < 0.7 else "downvote"
+    publication_id = rng.choice(state.publication_ids)
+    return await client.patch(f"/{action}_publication/{publication_id}/voter_{rng.randrange(VOTERS)}")
+
+
+async def get_by_id(client: httpx.AsyncClient, rng: random.Random, state: State) -> httpx.Response:
+    return await client.get(f"/get_publication_by_id/{rng.choice(state.publication_ids)}")
+
+
+async def user_feed(client: httpx.AsyncClient, rng: random.Random, state: State) -> httpx.Response:
+    return await client.get(f"/get_publications_of_user/bench_user_{rng.randrange(USERS)}")
+
+
+async def recent(client: httpx.AsyncClient, rng: random.Random, state: State) -> httpx.Response:
+    return await client.get("/get_recent_publications", params={"hours_time_delta": 1})
+
+
+async def trendtracker_batch(client: httpx.AsyncClient, rng: random.Random, state: State) -> httpx.Response:
+    ids = rng.sample(state.publication_ids, min(TRENDTRACKER_BATCH, len(state.publication_ids)))
+    return await client.post("/trend_tracker_get_many_publications", json={"id_list": ids})
+
+
+async def new_best(client: httpx.AsyncClient, rng: random.Random, state: State) -> httpx.Response:
+    return await client.get("/new_best_publications")  # ids from the TrendTracker stub, set by seed()
+
+
+async def image_download(client: httpx.AsyncClient, rng: random.Random, state: State) -> httpx.Response:
+    return await client.get(f"/images/{rng.choice(state.image_ids)}")
+
+
+OPERATIONS = {
+    "post_publication": post_publication,
+    "post_comment": post_comment,
+    "vote": vote,
+    "get_by_id": get_by_id,
+    "user_feed": user_feed,
+    "recent": recent,
+    "trendtracker_batch": trendtracker_batch,
+    "new_best": new_best,
+    "image_download": image_download,
+}
+
+
+async def seed(client: httpx.AsyncClient, trendtracker_url: str, rng: random.Random) -> State:
+    state = State()
+    for _ in range(SEED_PUBLICATIONS):
+        await post_publication(client, rng, state)
+    for publication_id in state.publication_ids[:SEED_PUBLICATIONS // 2]:
+        await client.post(f"/post_comment/{publication_id}", json={"user": "bench_user_0", "content": "first"})
+    for publication_id in state.publication_ids[:SEED_IMAGES]:
+        image = rng.randbytes(IMAGE_SIZE)
+        res = await client.post(f"/upload/{publication_id}", files={"file": ("bench.jpg", image, "image/jpeg")})
+        res.raise_for_status()
+        state.image_ids.append(res.json()["file_id"])
+    if trendtracker_url is not None:
+        async with httpx.AsyncClient(base_url=trendtracker_url) as trendtracker:
+            await trendtracker.put("/stub/new_best_ids", json=state.publication_ids[:20])
+    return state
+
+
+async def worker(client: httpx.AsyncClient, rng: random.Random, state: State, warmup_end: float, deadline: float,
+                 samples: dict[str, list[float]], errors: dict[str, int]) -> None:
+    names = list(MIX)
+    weights = list(MIX.values())
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        start = time.perf_counter()
+        try:
+            res = await OPERATIONS[name](client, rng, state)
+            failed = res.status_code >= 500
+        except httpx.HTTPError:
+            failed = True
+        end = time.perf_counter()
+        if start < warmup_end:
+            continue
+        samples[name].append(end - start)
+        if failed:
+            errors[name] += 1
+
+
+def summarize(latencies: list[float], errors: int, duration: float) -> dict:
+    if len(latencies) > 1:
+        quantiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    else:
+        quantiles = (latencies or [0.0]) * 99
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / duration, 1),
+        "p50_ms": round(quantiles[49] * 1000, 2),
+        "p95_ms": round(quantiles[94] * 1000, 2),
+        "p99_ms": round(quantiles[98] * 1000, 2),
+        "max_ms": round(max(latencies, default=0.0) * 1000, 2)
+    }
+
+
+async def run(url: str, trendtracker_url: str, concurrency: int, warmup: float, duration: float,
+              random_seed: int) -> dict:
+    # idle connections are dropped well before the 5 s keep-alive timeout of uvicorn: at 5 s on both sides,
+    # a request now and then went out on a connection the server was closing and failed with ReadError
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency, keepalive_expiry=1.0)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        state = await seed(client, trendtracker_url, random.Random(random_seed))
+        samples = {name: [] for name in MIX}
+        errors = {name: 0 for name in MIX}
+        warmup_end = time.perf_counter() + warmup
+        deadline = warmup_end + duration
+        await asyncio.gather(*(
+            worker(client, random.Random(random_seed + i + 1), state, warmup_end, deadline, samples, errors)
+            for i in range(concurrency)
+        ))
+    all_latencies = [latency for latencies in samples.values() for latency in latencies]
+    return {
+        "endpoints": {name: summarize(samples[name], errors[name], duration) for name in MIX},
+        "total": summarize(all_latencies, sum(errors.values()), duration)
+    }
+
+
+def compare(result: dict, baseline: dict) -> dict:
+    """Relative change (%) of throughput and latencies against a previous result"""
+    changes = {}
+    for name, current in {**result["endpoints"], "total": result["total"]}.items():
+        previous = baseline["total"] if name == "total" else baseline["endpoints"].get(name)
+        if previous is None:
+            continue
+        changes[name] = {
+            f"{key}_change_pct": round((current[key] - previous[key]) / previous[key] * 100, 1)
+            for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms") if previous[key]
+        }
+    return changes
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_until_up(url: str, process: subprocess.Popen, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with status {process.returncode}")
+        try:
+            httpx.get(url + "/docs", timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not start within {timeout}s")
+
+
+def start_services(backend: str) -> tuple[list[subprocess.Popen], str, str]:
+    """Start both stubs and the app; return the processes, the app URL and the TrendTracker stub URL"""
+    trendtracker_port, nft_port, app_port = free_port(), free_port(), free_port()
+    env = {
+        **os.environ,
+        "DEPLOYMENT_MODE": "DEBUG",
+        "TRENDTRACKER_URL": "http://127.0.0.1", "TRENDTRACKER_PORT": str(trendtracker_port),
+        "NFT_URL": "http://127.0.0.1", "NFT_PORT": str(nft_port),
+        "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING"),
+    }
+    stubs = [
+        subprocess.Popen([sys.executable, "-m", "uvicorn", f"stub_services:{name}", "--port", str(port),
+                          "--log-level", "warning"], cwd=DEV_DIR, env=env)
+        for name, port in (("trendtracker", trendtracker_port), ("nft", nft_port))
+    ]
+    app_command = [sys.executable, os.path.join(DEV_DIR, "benchmarks", "serve_app.py"), "--port", str(app_port)]
+    if backend == "mongomock":
+        app_command.append("--mongomock")
+    processes = [*stubs, subprocess.Popen(app_command, env=env)]
+    urls = [f"http://127.0.0.1:{port}" for port in (trendtracker_port, nft_port, app_port)]
+    try:
+        for url, process in zip(urls, processes):
+            wait_until_up(url, process)
+    except BaseException:
+        stop_services(processes)
+        raise
+    return processes, urls[2], urls[0]
+
+
+def stop_services(processes: list[subprocess.Popen]) -> None:
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.wait(timeout=30)
+
+
+def git_commit() -> str or None:
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=DEV_DIR, text=True).strip()
+        dirty = subprocess.check_output(["git", "status", "--porcelain", "--", "src"], cwd=DEV_DIR, text=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ("-dirty" if dirty else "")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["mongod", "mongomock"], default="mongod")
+    parser.add_argument("--url", help="benchmark this running service instead of starting one")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--warmup", type=float, default=5.0)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="also write the result to this file")
+    parser.add_argument("--baseline", help="result file of a previous run to compare with")
+    args = parser.parse_args()
+
+    processes = []
+    url, trendtracker_url = args.url, None
+    if url is None:
+        processes, url, trendtracker_url = start_services(args.backend)
+    try:
+        measures = asyncio.run(run(url, trendtracker_url, args.concurrency, args.warmup, args.duration, args.seed))
+    finally:
+        stop_services(processes)
+
+    result = {
+        "commit": git_commit(),
+        "backend": "external" if args.url else args.backend,
+        "concurrency": args.concurrency,
+        "duration_s": args.duration,
+        "seed": args.seed,
+        "mix": MIX,
+        **measures
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            result["vs_baseline"] = compare(result, json.load(f))
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Start the service for load_benchmark.py, on a throwaway database.
+
+    python _dev/benchmarks/serve_app.py --port 8000             # local mongod on 127.0.0.1:27017
+    python _dev/benchmarks/serve_app.py --port 8000 --mongomock  # in-process stand-in, no mongod needed
+
+The environment of the service (TRENDTRACKER_URL, NFT_URL, ...) is expected to be set already.
+With mongod, the data goes to the "publications-bench" database, dropped on start and on exit.
+"""
+import argparse
+import os
+import sys
+
+import uvicorn
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "src"))
+os.environ.setdefault("DEPLOYMENT_MODE", "DEBUG")
+
+BENCH_DATABASE = "publications-bench"
+
+
+def use_mongomock() -> None:
+    import mongomock
+    import pymongo
+    from mongomock.gridfs import enable_gridfs_integration
+
+    enable_gridfs_integration()
+    pymongo.MongoClient = mongomock.MongoClient
+    os.environ["DB_THREADPOOL_SIZE"] = "1"  # mongomock is not thread-safe
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--mongomock", action="store_true")
+    args = parser.parse_args()
+
+    if args.mongomock:
+        use_mongomock()
+    os.environ["DB_NAME"] = BENCH_DATABASE  # every collection of the service, workers' queues included
+    import main as service  # noqa: E402, after the MongoClient swap
+
+    db = service.mongodb_interface.sync
+    db.client.drop_database(BENCH_DATABASE)
+    try:
+        uvicorn.run(service.app, host="127.0.0.1", port=args.port, log_level="warning")
+    finally:
+        db.client.drop_database(BENCH_DATABASE)
+
+
+if __name__ == "__main__":
+    main()
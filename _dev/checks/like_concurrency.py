@@ -0,0 +1,66 @@
+"""Hammer one publication with concurrent likes and unlikes and check the final likes_count.
+
+Start a local mongod and the service in debug mode (see debug.sh), then run:
+
+    python _dev/checks/like_concurrency.py --url http://127.0.0.1:8000
+
+Every user sends `--repeat` likes at once, so duplicates race each other. The count must end equal to the
+number of users, then back to 0 after the same storm of unlikes. Exits with status 1 on any mismatch.
+"""
+import argparse
+import asyncio
+import sys
+
+import httpx
+
+
+async def storm(client: httpx.AsyncClient, action: str, publication_id: str, users: int, repeat: int) -> dict:
+    requests = [
+        client.patch(f"/{action}_publication/{publication_id}/user_{user}")
+        for user in range(users)
+        for _ in range(repeat)
+    ]
+    statuses = {}
+    for res in await asyncio.gather(*requests):
+        statuses[res.status_code] = statuses.get(res.status_code, 0) + 1
+    return statuses
+
+
+async def likes_count(client: httpx.AsyncClient, publication_id: str) -> int:
+    res = await client.get(f"/get_publication_by_id/{publication_id}")
+    return res.json()["publication"]["likes_count"]
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    limits = httpx.Limits(max_connections=args.users)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60) as client:
+        res = await client.post("/post_publication", json={
+            "publication_name": "like storm",
+            "user_name": "like_check",
+            "description": "concurrency check",
+            "media_url": "/api/images/000000000000000000000000",
+            "content_type": "image",
+            "category": "photography"
+        })
+        publication_id = res.json()["publication_id"]
+
+        failed = False
+        for action, expected in (("upvote", args.users), ("downvote", 0)):
+            statuses = await storm(client, action, publication_id, args.users, args.repeat)
+            count = await likes_count(client, publication_id)
+            ok = count == expected and statuses.get(200) == args.users
+            failed = failed or not ok
+            print(f"{action}: statuses={statuses} likes_count={count} expected={expected} {'OK' if ok else 'FAIL'}")
+
+        await client.delete(f"/delete_publication_by_id/{publication_id}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,59 @@
+"""Local stand-ins for the TrendTracker and NFT services.
+
+    cd _dev && uvicorn stub_services:trendtracker --port 8001
+    cd _dev && uvicorn stub_services:nft --port 8002
+
+then start the service with TRENDTRACKER_URL=http://127.0.0.1 TRENDTRACKER_PORT=8001
+NFT_URL=http://127.0.0.1 NFT_PORT=8002.
+
+STUB_LATENCY (seconds) delays every answer and STUB_FAILURE_RATE (0..1) answers that share of
+requests with a 503, to exercise timeouts, retries and the circuit breaker.
+"""
+import asyncio
+import os
+import random
+
+from fastapi import FastAPI, Response, status
+
+STUB_LATENCY = float(os.environ.get("STUB_LATENCY", 0))
+STUB_FAILURE_RATE = float(os.environ.get("STUB_FAILURE_RATE", 0))
+
+trendtracker = FastAPI()
+nft = FastAPI()
+
+best_ids: list[str] = []
+
+
+async def simulate(response: Response) -> bool:
+    """Apply the configured latency, return False when this request should fail"""
+    await asyncio.sleep(STUB_LATENCY)
+    if random.random() < STUB_FAILURE_RATE:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return False
+    return True
+
+
+@trendtracker.put("/stub/new_best_ids")
+async def set_best_ids(ids: list[str]):
+    best_ids[:] = ids
+    return {"new_best_ids": best_ids}
+
+
+@trendtracker.get("/get_new_best_publications_ids")
+async def get_new_best_publications_ids(response: Response):
+    if not await simulate(response):
+        return {"message": "stub failure"}
+    if not best_ids:
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
+    return {"new_best_ids": best_ids}
+
+
+@nft.post("/mint")
+async def mint(nft_request: dict, response: Response):
+    if not await simulate(response):
+        return {"message": "stub failure"}
+    return {
+        "token_id": random.randrange(1, 2 ** 32),
+        "owner": nft_request.get("address"),
+        "token_uri": nft_request.get("file_url")
+    }
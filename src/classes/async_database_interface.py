@@ -0,0 +1,50 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from classes import metrics
+from classes.database_interface import DBInterface
+
+_to_list = metrics.timed("to_list", list)
+
+
+class AsyncDBInterface:
+    """Awaitable counterpart of DBInterface.
+
+    Every public method of DBInterface is available here under the same name as a coroutine function.
+    The blocking pymongo call is run in a dedicated thread pool, so a slow Mongo round-trip only holds
+    one worker thread instead of the whole event loop.
+    """
+
+    def __init__(self, db_interface: DBInterface = None, max_workers: int = None):
+        self.sync = db_interface if db_interface is not None else DBInterface()
+        if max_workers is None:
+            # Same default as pymongo's maxPoolSize: more threads would only wait for a socket
+            max_workers = int(os.environ.get("DB_THREADPOOL_SIZE", 100))
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="mongodb")
+
+    async def run(self, func, *args, **kwargs):
+        """Run any blocking callable (cursor iteration, GridOut.read, ...) in the database thread pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    async def to_list(self, cursor) -> list:
+        """Exhaust a cursor returned by a DBInterface query method without blocking the event loop."""
+        return await self.run(_to_list, cursor)
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.sync, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def method(*args, **kwargs):
+            return await self.run(attr, *args, **kwargs)
+
+        setattr(self, name, method)  # build the wrapper only once per method
+        return method
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=True)
+        self.sync.client.close()
@@ -0,0 +1,70 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+class ByteBudgetLRU:
+    """Thread-safe LRU cache with a TTL and a memory budget of `max_bytes`, shared by the caches of the service.
+
+    Every entry is stored with its size in bytes, the least recently used ones are evicted once the
+    budget is exceeded. The public methods take the lock; the underscored ones expect it to be held,
+    so that subclasses can check their own state and write an entry atomically.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries: OrderedDict[Hashable, tuple[float, Any, int]] = OrderedDict()  # key: expiry, value, size
+        self.size = 0
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def lookup(self, key: Hashable) -> Any or None:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            expires_at, value, _ = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                self.stats["expirations"] += 1
+                self.stats["misses"] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return value
+
+    def _store(self, key: Hashable, value: Any, size: int) -> None:
+        if size > self.max_bytes:
+            return
+        if key in self.entries:
+            self._remove(key)
+        self.entries[key] = (time.monotonic() + self.ttl, value, size)
+        self.size += size
+        while self.size > self.max_bytes:
+            self._remove(next(iter(self.entries)))
+            self.stats["evictions"] += 1
+
+    def _invalidate(self, key: Hashable) -> None:
+        if key in self.entries:
+            self._remove(key)
+            self.stats["invalidations"] += 1
+
+    def clear(self) -> None:
+        with self.lock:
+            self._clear()
+
+    def _clear(self) -> None:
+        self.stats["invalidations"] += len(self.entries)
+        self.entries.clear()
+        self.size = 0
+
+    def _remove(self, key: Hashable) -> None:
+        _, _, size = self.entries.pop(key)
+        self.size -= size
+
+    def metrics(self) -> dict:
+        with self.lock:
+            return {"entries": len(self.entries), "bytes": self.size, "max_bytes": self.max_bytes, **self.stats}
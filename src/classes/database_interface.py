@@ -1,12 +1,49 @@
 import pymongo
-from pymongo.collection import ReturnDocument
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, ServerSelectionTimeoutError
 import os
-from pprint import pprint
 from bson import ObjectId
 import datetime
 import gridfs
+import hashlib
+import io
+import logging
+from typing import BinaryIO
+from urllib.parse import urlparse
 
+from classes import metrics
+from classes.image_cache import CachedImage, ImageCache
+from classes.publication_cache import PublicationCache
+from classes.structured_logging import event, stop_logging
 
+logger = logging.getLogger(__name__)
+
+HASHTAG_COUNT_RETENTION_HOURS = 7 * 24  # TTL of the hourly hashtag counts, the longest trending window
+DELETION_JOB_RETENTION_HOURS = 7 * 24  # TTL of the finished deletion jobs
+MINT_JOB_RETENTION_HOURS = 7 * 24  # TTL of the minted jobs, dead-lettered ones are kept
+
+# Publications marked by a deletion stay in the collection until the deletion worker purges them
+NOT_DELETED = {"deleted_at": None}
+
+
+class FileTooLargeError(Exception):
+    """Raised when an uploaded stream exceeds the allowed size; the partial GridFS file is discarded."""
+
+
+class VoteFlushError(Exception):
+    """Raised by bulk_vote when some deltas were not applied.
+
+    `retry` holds the deltas known not to be written, safe to apply again; `lost` those whose write
+    may or may not have happened (e.g. a connection dropped mid-write), which must not be retried.
+    """
+
+    def __init__(self, retry: dict[tuple, int], lost: dict[tuple, int], error: Exception):
+        super().__init__(f"{len(retry)} vote targets to retry, {len(lost)} lost: {error!r}")
+        self.retry = retry
+        self.lost = lost
+
+
+@metrics.instrument_methods
 class DBInterface:
 
     def __init__(self):
@@ -19,270 +56,583 @@ class DBInterface:
             self.database = self.client[db_name]  # select MongoDB's database
             self.collection = self.database[collection_name]  # select database's Collection
 
-            print("INFO: Deployment in production mode.")
+            logger.info("Deployment in production mode.")
 
         elif os.environ["DEPLOYMENT_MODE"] == "DEBUG":
             self.client = pymongo.MongoClient("mongodb://127.0.0.1:27017/")  # connection to MongoDB
-            self.database = self.client["publications-service"]  # select MongoDB's database
+            self.database = self.client[os.environ.get("DB_NAME", "publications-service")]  # select MongoDB's database
             self.collection = self.database["publications"]  # select database's Collection
 
-            print("INFO: Deployment in debug mode.")
+            logger.info("Deployment in debug mode.")
 
         else:
-            print("ERROR: Bad deployment mode.")
+            logger.critical("Bad deployment mode.")
+            stop_logging()  # write the record before exiting
             exit(1)
 
+        self.comments = self.database["comments"]  # comments and replies, one document each
+        self.hashtag_counts = self.database["hashtag_counts"]  # publications per hashtag and hour
+        self.deletion_jobs = self.database["deletion_jobs"]  # progress of the purges of deleted publications
+        self.mint_jobs = self.database["mint_jobs"]  # queue of the NFTs to mint
         self.fs = gridfs.GridFS(self.database)  # Set up GridFS for the database
 
+        # In-process cache of get_one_publication, disabled when its budget is 0
+        cache_max_bytes = int(os.environ.get("PUBLICATION_CACHE_MAX_BYTES", 0))
+        cache_ttl = float(os.environ.get("PUBLICATION_CACHE_TTL", 30))  # seconds
+        self.cache = PublicationCache(cache_max_bytes, cache_ttl) if cache_max_bytes > 0 else None
+
+        # In-process cache of the image files served by /images, disabled when its budget is 0
+        image_cache_max_bytes = int(os.environ.get("IMAGE_CACHE_MAX_BYTES", 0))
+        image_cache_max_item_bytes = int(os.environ.get("IMAGE_CACHE_MAX_ITEM_BYTES", 1024 * 1024))
+        image_cache_ttl = float(os.environ.get("IMAGE_CACHE_TTL", 300))  # seconds
+        self.image_cache = ImageCache(image_cache_max_bytes, image_cache_max_item_bytes, image_cache_ttl) \
+            if image_cache_max_bytes > 0 else None
+
+    def _invalidate(self, publication_id) -> None:
+        if self.cache is not None:
+            self.cache.invalidate(str(publication_id))
+
     def insert_one_publication(self, publication: dict) -> str:
+        comments = None
+        if "comments" in publication:  # legacy embedded thread, as in utils.samples
+            publication = dict(publication)
+            comments = publication.pop("comments")
+            publication["comments_count"] = len(comments)
         result = self.collection.insert_one(publication)
-        print(f"Publication {result.inserted_id} inserted in database")
-        file_id = publication["media_url"].split("/")[3]
-        self.database["pub_like_map"].insert_one({
-            "_id": result.inserted_id,
-            "file_id": file_id,
-            "user_list": []
-        })
+        if comments:
+            self.comments.insert_many(self.thread_documents(result.inserted_id, comments))
+        self._count_hashtags([publication], 1)
+        logger.info("Publication %s inserted in database", result.inserted_id,
+                    extra=event("publication.write", publication_id=str(result.inserted_id)))
+        self.database["pub_like_map"].insert_one(self._like_map(publication))
         return str(result.inserted_id)
 
-    def delete_one_publication(self, publication_id: str) -> dict:
-        removed_publication = self.collection.find_one_and_delete({'_id': ObjectId(publication_id)})
-        self.del_like_user_list(publication_id)
-        url: str = removed_publication["media_url"]
-        if url:
-            file_id = url.split("/")[3]
-            self.delete_image(file_id)
-        print(f"Publication: {publication_id} removed from the database")
-        return removed_publication
-
-    def delete_user_publications(self, user_name: str) -> pymongo.results.DeleteResult:
-        log = self.collection.delete_many({'user_name': user_name})
-        print(f"\n{log.deleted_count} publications of {user_name} removed")
-        return log
-
-    def get_one_publication(self, publication_id: str) -> dict or None:
-        publication = self.collection.find_one({"_id": ObjectId(publication_id)})
-        if publication is not None:
-            print("Publication " + str(publication["_id"]) + " returned.")
-        return publication
+    def insert_many_publications(self, publications: list[dict]) -> dict[int, str]:
+        """Insert built publications, then their like maps, with one unordered insert_many each.
+
+        Return the error message of every publication that could not be inserted, by position.
+        """
+        errors = {}
+        try:
+            self.collection.insert_many(publications, ordered=False)
+        except BulkWriteError as e:
+            errors = {error["index"]: error["errmsg"] for error in e.details["writeErrors"]}
+        inserted = [publication for i, publication in enumerate(publications) if i not in errors]
+        if inserted:
+            self.database["pub_like_map"].insert_many([self._like_map(p) for p in inserted], ordered=False)
+            self._count_hashtags(inserted, 1)
+        logger.info("%d/%d publications inserted in bulk", len(inserted), len(publications),
+                    extra=event("publication.write", count=len(inserted), errors=len(errors)))
+        return errors
+
+    def _like_map(self, publication: dict) -> dict:
+        return {
+            "_id": publication["_id"],
+            "file_id": self.media_file_id(publication["media_url"]),
+            "user_list": []
+        }
+
+    @staticmethod
+    def media_file_id(media_url: str) -> str or None:
+        """GridFS file id of a media_url served by this service (/api/images/<id>), None for any other URL"""
+        segments = urlparse(media_url or "").path.rstrip("/").split("/")
+        if len(segments) >= 2 and segments[-2] == "images" and ObjectId.is_valid(segments[-1]):
+            return segments[-1]
+        return None
 
-    def get_user_publications(self, user_name: str) -> list[dict] or list:
-        cursor = self.collection.find({'user_name': user_name})
-        publications = []
+    def delete_one_publication(self, publication_id: str) -> dict or None:
+        """Mark a publication as deleted and queue its purge; None if it does not exist or is already marked.
 
-        for publication in cursor:
-            publications.append(publication)
-        print(f"{len(publications)} publications returned for {user_name}")
-        return publications
+        It disappears from every read at once, its comments, like map and image are removed by the deletion worker.
+        """
+        marked = self.collection.find_one_and_update(
+            {"_id": ObjectId(publication_id), **NOT_DELETED},
+            {"$set": {"deleted_at": datetime.datetime.now()}},
+            projection={"_id": 1}
+        )
+        self._invalidate(publication_id)
+        if marked is None:
+            return None
+        job = self._create_deletion_job("publication", {"_id": marked["_id"]}, 1)
+        logger.info("Publication %s marked as deleted", publication_id,
+                    extra=event("publication.write", publication_id=publication_id, job_id=str(job["_id"])))
+        return job
+
+    def delete_user_publications(self, user_name: str) -> dict or None:
+        """Mark every publication of a user as deleted and queue their purge; None if the user has none"""
+        result = self.collection.update_many(
+            {"user_name": user_name, **NOT_DELETED},
+            {"$set": {"deleted_at": datetime.datetime.now()}}
+        )
+        if self.cache is not None:
+            self.cache.clear()  # the ids of the marked publications are unknown
+        if result.modified_count == 0:
+            return None
+        job = self._create_deletion_job("user", {"user_name": user_name}, result.modified_count)
+        logger.info("%d publications of %s marked as deleted", result.modified_count, user_name,
+                    extra=event("publication.write", user_name=user_name, count=result.modified_count,
+                                job_id=str(job["_id"])))
+        return job
+
+    def _create_deletion_job(self, kind: str, target: dict, total: int) -> dict:
+        now = datetime.datetime.now()
+        job = {
+            "_id": ObjectId(),
+            "kind": kind,  # publication or user
+            "target": target,  # the publications to purge are the marked ones matching it
+            "status": "pending",  # then running, then done
+            "total": total,
+            "purged": 0,
+            "created_at": now,
+            "updated_at": now,
+            "finished_at": None,
+            "lease_until": now  # claimable at once
+        }
+        self.deletion_jobs.insert_one(job)
+        return job
+
+    def get_deletion_job(self, job_id: str) -> dict or None:
+        return self.deletion_jobs.find_one({"_id": ObjectId(job_id)}, {"lease_until": 0})
+
+    def claim_deletion_job(self, lease: float) -> dict or None:
+        """Take the oldest unfinished job whose lease expired (never claimed, or its worker died) for `lease` seconds"""
+        now = datetime.datetime.now()
+        return self.deletion_jobs.find_one_and_update(
+            {"status": {"$in": ["pending", "running"]}, "lease_until": {"$lte": now}},
+            {"$set": {"status": "running", "updated_at": now,
+                      "lease_until": now + datetime.timedelta(seconds=lease)}},
+            sort=[("created_at", pymongo.ASCENDING)],
+            return_document=pymongo.ReturnDocument.AFTER
+        )
 
-    def delete_one_comment(self, comment_id: str, publication_id: str) -> bool:
-        updated_publication = self.collection.find_one_and_update(
-            {
-                "_id": ObjectId(publication_id),
-                "comments._id": ObjectId(comment_id)
-            },
-            {
-                "$pull": {
-                    "comments": {
-                        "_id": ObjectId(comment_id)
-                    }
-                }
-            },
-            return_document=ReturnDocument.AFTER
+    def get_deleted_publications(self, target: dict, limit: int) -> list[dict]:
+        """Next publications marked as deleted matching the `target` of a deletion job"""
+        return list(self.collection.find(
+            {**target, "deleted_at": {"$ne": None}},
+            {"media_url": 1, "hashtags": 1, "publication_date": 1}
+        ).limit(limit))
+
+    def purge_publications(self, publications: list[dict]) -> int:
+        """Remove marked publications with everything linked to them: comments, like maps (which also
+        unpublishes their NFT) and GridFS images, except the images minted as NFT which belong to a wallet.
+
+        Every step is idempotent and the publications go last, so a purge interrupted midway is simply redone.
+        Return the number of files deleted from GridFS.
+        """
+        publication_ids = [publication["_id"] for publication in publications]
+        self.comments.delete_many({"publication_id": {"$in": publication_ids}})
+        self.database["pub_like_map"].delete_many({"_id": {"$in": publication_ids}})
+        file_ids = {ObjectId(file_id) for file_id in map(self.media_file_id,
+                                                         (p.get("media_url") for p in publications)) if file_id}
+        if file_ids:
+            file_ids -= set(self.database["nfts_meta"].distinct("_id", {"_id": {"$in": list(file_ids)}}))
+        for file_id in file_ids:
+            self.fs.delete(file_id)
+        if file_ids:
+            self._delete_variants(list(file_ids))
+        self.collection.delete_many({"_id": {"$in": publication_ids}, "deleted_at": {"$ne": None}})
+        self._count_hashtags(publications, -1)
+        logger.info("%d publications purged, %d images deleted", len(publications), len(file_ids),
+                    extra=event("publication.purge", count=len(publications), files=len(file_ids)))
+        return len(file_ids)
+
+    def advance_deletion_job(self, job_id: ObjectId, purged: int, lease: float) -> None:
+        """Record the progress of a job and extend the lease of its worker"""
+        now = datetime.datetime.now()
+        self.deletion_jobs.update_one(
+            {"_id": job_id},
+            {"$inc": {"purged": purged},
+             "$set": {"updated_at": now, "lease_until": now + datetime.timedelta(seconds=lease)}}
         )
-        if updated_publication is None:
-            return False
-        else:
-            pprint(f"Publication {publication_id} successfully updated")
-            return True
 
-    def delete_one_reply(self, reply_id: str, comment_id: str, publication_id: str) -> bool:
-        updated_publication = self.collection.find_one_and_update(
-            {
-                "_id": ObjectId(publication_id),
-                "comments._id": ObjectId(comment_id),
-                "comments.replies._id": ObjectId(reply_id)
-            },
-            {
-                "$pull": {
-                    "comments.$.replies": {
-                        "_id": ObjectId(reply_id)
-                    }
-                }
-            },
-            return_document=ReturnDocument.AFTER
+    def finish_deletion_job(self, job_id: ObjectId) -> None:
+        now = datetime.datetime.now()
+        self.deletion_jobs.update_one(
+            {"_id": job_id},
+            {"$set": {"status": "done", "updated_at": now, "finished_at": now}}
         )
-        if updated_publication is None:
-            return False
-        else:
-            pprint(f"Publication {publication_id} successfully updated")
-            return True
 
-    def upvote_one_publication(self, publication_id) -> bool:
-        updated_pub = self.collection.find_one_and_update(
-            {"_id": ObjectId(publication_id)},
-            {
-                "$inc": {
-                    "likes_count": 1
-                }
-            }
+    def get_one_publication(self, publication_id: str, projection: dict = None) -> dict or None:
+        use_cache = self.cache is not None and projection is None
+        if use_cache:
+            publication = self.cache.get(publication_id)
+            if publication is not None:
+                return publication
+            ticket = self.cache.ticket()
+        publication = self.collection.find_one({"_id": ObjectId(publication_id), **NOT_DELETED}, projection)
+        if publication is not None:
+            if use_cache:
+                self.cache.put(publication_id, publication, ticket)
+            logger.debug("Publication %s returned", publication_id,
+                         extra=event("publication.read", publication_id=publication_id))
+        return publication
+
+    def get_publications(self, publication_ids: list[str]) -> list[dict]:
+        """Publications in the order of `publication_ids` with one $in query, missing ones are skipped."""
+        cursor = self.collection.find({"_id": {"$in": [ObjectId(_id) for _id in publication_ids]}, **NOT_DELETED})
+        publications = {str(doc["_id"]): doc for doc in cursor}
+        logger.debug("%d/%d publications returned", len(publications), len(publication_ids),
+                     extra=event("publication.read", count=len(publications)))
+        return [publications[_id] for _id in publication_ids if _id in publications]
+
+    def get_publications_likes(self, publication_ids: list[str]) -> dict[str, int]:
+        cursor = self.collection.find(
+            {"_id": {"$in": [ObjectId(_id) for _id in publication_ids]}, **NOT_DELETED},
+            {"likes_count": 1}
+        )
+        likes = {str(doc["_id"]): doc["likes_count"] for doc in cursor}
+        logger.debug("Likes of %d/%d publications returned", len(likes), len(publication_ids),
+                     extra=event("publication.read", count=len(likes)))
+        return likes
+
+    def get_user_publications(self, user_name: str, projection: dict = None,
+                              after: tuple = None, limit: int = None) -> pymongo.cursor.Cursor:
+        logger.debug("Publications of %s requested", user_name, extra=event("publication.read", user_name=user_name))
+        return self._newest_first({'user_name': user_name}, projection, after, limit)
+
+    def _newest_first(self, query: dict, projection: dict = None,
+                      after: tuple = None, limit: int = None) -> pymongo.cursor.Cursor:
+        """Page through publications by (publication_date, _id) descending, starting strictly after
+        the (publication_date, _id) key `after` of the previous page."""
+        query = {**query, **NOT_DELETED}
+        if after is not None:
+            query = {"$and": [query, self._after(after)]}
+        cursor = self.collection.find(query, projection).sort(
+            [("publication_date", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)]
+        )
+        if limit is not None:
+            cursor = cursor.limit(limit)
+        return cursor
+
+    @staticmethod
+    def _after(after: tuple, direction: int = pymongo.DESCENDING) -> dict:
+        date, _id = after
+        operator = "$lt" if direction == pymongo.DESCENDING else "$gt"
+        return {"$or": [
+            {"publication_date": {operator: date}},
+            {"publication_date": date, "_id": {operator: _id}}
+        ]}
+
+    def _thread_filter(self, publication_id: str, comment_id: str, reply_id: str = None) -> dict:
+        """Filter matching a comment of a publication, or a reply of that comment"""
+        if reply_id is None:
+            return {"_id": ObjectId(comment_id), "publication_id": ObjectId(publication_id), "parent_id": None}
+        return {"_id": ObjectId(reply_id), "publication_id": ObjectId(publication_id), "parent_id": ObjectId(comment_id)}
+
+    def get_hashtag_publications(self, hashtag: str, projection: dict = None,
+                                 after: tuple = None, limit: int = None) -> pymongo.cursor.Cursor:
+        logger.debug("Publications tagged %s requested", hashtag, extra=event("publication.read", hashtag=hashtag))
+        return self._newest_first({"hashtags": hashtag}, projection, after, limit)
+
+    @staticmethod
+    def hashtag_counts_by_hour(publications) -> dict[tuple[str, datetime.datetime], int]:
+        """Number of publications per (hashtag, hour of publication)"""
+        counts = {}
+        for publication in publications:
+            hour = publication["publication_date"].replace(minute=0, second=0, microsecond=0)
+            for hashtag in set(publication.get("hashtags", [])):
+                counts[hashtag, hour] = counts.get((hashtag, hour), 0) + 1
+        return counts
+
+    @staticmethod
+    def hashtag_count_update(hashtag: str, hour: datetime.datetime, update: dict, upsert: bool) -> UpdateOne:
+        return UpdateOne(
+            {"_id": f"{hour:%Y%m%d%H}:{hashtag}"},
+            {**update, "$setOnInsert": {"hashtag": hashtag, "hour": hour}} if upsert else update,
+            upsert=upsert
         )
-        if updated_pub is None:
-            return False
-        else:
-            print(f'Publication \'{publication_id}\' got 1 like.')
-            return True
 
-    def upvote_one_comment(self, publication_id: str, comment_id: str):
-        updated_pub = self.collection.find_one_and_update(
-            {
-                "_id": ObjectId(publication_id),
-                "comments._id": ObjectId(comment_id)
-            },
-            {
-                "$inc": {
-                    "comments.$.likes_count": 1
-                }
-            }
+    def _count_hashtags(self, publications: list[dict], delta: int) -> None:
+        """Add `delta` to the hourly counts of the hashtags of `publications`.
+
+        Decrements never create a count: the bucket of an old publication may have expired already.
+        """
+        operations = [
+            self.hashtag_count_update(hashtag, hour, {"$inc": {"count": count * delta}}, upsert=delta > 0)
+            for (hashtag, hour), count in self.hashtag_counts_by_hour(publications).items()
+        ]
+        if operations:
+            self.hashtag_counts.bulk_write(operations, ordered=False)
+
+    def get_top_hashtags(self, since: datetime.datetime, limit: int) -> list[dict]:
+        """Most used hashtags of the publications posted since `since`, rounded down to the hour"""
+        hour = since.replace(minute=0, second=0, microsecond=0)
+        return list(self.hashtag_counts.aggregate([
+            {"$match": {"hour": {"$gte": hour}}},
+            {"$group": {"_id": "$hashtag", "count": {"$sum": "$count"}}},
+            {"$match": {"count": {"$gt": 0}}},
+            {"$sort": {"count": pymongo.DESCENDING, "_id": pymongo.ASCENDING}},
+            {"$limit": limit},
+            {"$project": {"_id": 0, "hashtag": "$_id", "count": 1}}
+        ]))
+
+    @staticmethod
+    def thread_documents(publication_id: ObjectId, comments: list[dict]) -> list[dict]:
+        """Flatten a legacy embedded comments array into documents of the comments collection"""
+        documents = []
+        for comment in comments:
+            replies = comment.get("replies", [])
+            comment_id = comment.get("_id") or ObjectId()
+            documents.append({
+                **{key: value for key, value in comment.items() if key != "replies"},
+                "_id": comment_id,
+                "publication_id": publication_id,
+                "parent_id": None,
+                "replies_count": len(replies)
+            })
+            for reply in replies:
+                documents.append({
+                    **reply,
+                    "_id": reply.get("_id") or ObjectId(),
+                    "publication_id": publication_id,
+                    "parent_id": comment_id
+                })
+        return documents
+
+    def is_visible(self, publication_id: str) -> bool:
+        """Whether a publication exists and is not marked as deleted"""
+        return self.collection.count_documents({"_id": ObjectId(publication_id), **NOT_DELETED}, limit=1) > 0
+
+    def get_comments(self, publication_id: str, after: tuple = None,
+                     limit: int = None) -> pymongo.cursor.Cursor or None:
+        """Comments of a publication, None when it is marked as deleted or does not exist"""
+        if not self.is_visible(publication_id):
+            return None
+        return self._oldest_first({"publication_id": ObjectId(publication_id), "parent_id": None}, after, limit)
+
+    def get_replies(self, publication_id: str, comment_id: str,
+                    after: tuple = None, limit: int = None) -> pymongo.cursor.Cursor or None:
+        if not self.is_visible(publication_id):
+            return None
+        return self._oldest_first(
+            {"publication_id": ObjectId(publication_id), "parent_id": ObjectId(comment_id)}, after, limit)
+
+    def _oldest_first(self, query: dict, after: tuple = None, limit: int = None) -> pymongo.cursor.Cursor:
+        if after is not None:
+            query = {"$and": [query, self._after(after, pymongo.ASCENDING)]}
+        cursor = self.comments.find(query).sort(
+            [("publication_date", pymongo.ASCENDING), ("_id", pymongo.ASCENDING)]
         )
-        if updated_pub is None:
+        if limit is not None:
+            cursor = cursor.limit(limit)
+        return cursor
+
+    def delete_one_comment(self, comment_id: str, publication_id: str) -> bool:
+        result = self.comments.delete_one(self._thread_filter(publication_id, comment_id))
+        if result.deleted_count == 0:
             return False
-        else:
-            print(f'Comment \'{comment_id}\' got a like.')
-            return True
+        self.comments.delete_many({"publication_id": ObjectId(publication_id), "parent_id": ObjectId(comment_id)})
+        self.collection.update_one({"_id": ObjectId(publication_id)}, {"$inc": {"comments_count": -1}})
+        self._invalidate(publication_id)
+        logger.info("Comment %s of publication %s deleted", comment_id, publication_id,
+                    extra=event("comment.write", publication_id=publication_id, comment_id=comment_id))
+        return True
 
-    # FIXME
-    def upvote_one_reply(self, publication_id: str, comment_id: str, reply_id: str):
-        updated_pub = self.collection.find_one_and_update(
-            {
-                "_id": ObjectId(publication_id),
-                "comments._id": ObjectId(comment_id),
-                "comments.replies._id": ObjectId(reply_id)
-            },
-            {
-                "$inc": {
-                    "replies.$.likes_count": 1
-                }
-            },
-            return_document=ReturnDocument.AFTER
-        )
-        print(updated_pub)
-        if updated_pub is None:
+    def delete_one_reply(self, reply_id: str, comment_id: str, publication_id: str) -> bool:
+        result = self.comments.delete_one(self._thread_filter(publication_id, comment_id, reply_id))
+        if result.deleted_count == 0:
             return False
-        else:
-            print(f'Reply \'{reply_id}\' got a like.')
-            return True
+        self.comments.update_one({"_id": ObjectId(comment_id)}, {"$inc": {"replies_count": -1}})
+        logger.info("Reply %s of comment %s deleted", reply_id, comment_id,
+                    extra=event("comment.write", publication_id=publication_id, comment_id=reply_id))
+        return True
 
-    def insert_one_comment(self, publication_id: str, comment: dict) -> str:
-        result = self.collection.find_one_and_update(
-            {
-                "_id": ObjectId(publication_id)
-            },
-            {
-                "$addToSet": {
-                    "comments": comment
-                }
-            },
-            return_document=ReturnDocument.AFTER
+    def _inc_comment_likes(self, delta: int, publication_id: str, comment_id: str, reply_id: str = None) -> bool:
+        if not self.is_visible(publication_id):
+            return False
+        result = self.comments.update_one(
+            self._thread_filter(publication_id, comment_id, reply_id),
+            {"$inc": {"likes_count": delta}}
         )
-        result_id = result["comments"][-1]["_id"]
-        print(f"Comment with id '{result_id}' by '{result['comments'][-1]['user']}' inserted in DB")
-        return result_id
+        return result.matched_count > 0
 
-    def insert_one_reply(self, publication_id: str, comment_id: str, reply: dict) -> str:
-        new_id = ObjectId()
-        reply["_id"] = new_id
-        self.collection.find_one_and_update(
-            {
-                "_id": ObjectId(publication_id),
-                "comments._id": ObjectId(comment_id)
-            },
-            {
-                "$addToSet": {
-                    "comments.$.replies": reply
-                }
-            },
-            return_document=ReturnDocument.AFTER
-        )
-        print(
-            f"Reply with id '{new_id}' by '{reply['user']}' inserted in DB")
-        return str(new_id)
+    def upvote_one_comment(self, publication_id: str, comment_id: str) -> bool:
+        if not self._inc_comment_likes(1, publication_id, comment_id):
+            return False
+        logger.debug("Comment %s got 1 like", comment_id, extra=event("comment.vote", comment_id=comment_id, delta=1))
+        return True
 
-    def downvote_one_publication(self, publication_id: str) -> bool:
-        updated_pub = self.collection.find_one_and_update(
-            {"_id": ObjectId(publication_id)},
-            {
-                "$inc": {
-                    "likes_count": -1
-                }
-            }
-        )
-        if updated_pub is None:
+    def upvote_one_reply(self, publication_id: str, comment_id: str, reply_id: str) -> bool:
+        if not self._inc_comment_likes(1, publication_id, comment_id, reply_id):
             return False
-        else:
-            print(f'Publication \'{publication_id}\' got -1 like.')
-            return True
+        logger.debug("Reply %s got 1 like", reply_id, extra=event("comment.vote", comment_id=reply_id, delta=1))
+        return True
+
+    def insert_one_comment(self, publication_id: str, comment: dict) -> ObjectId or None:
+        publication = self.collection.find_one_and_update(
+            {"_id": ObjectId(publication_id), **NOT_DELETED},
+            {"$inc": {"comments_count": 1}},
+            projection={"_id": 1}
+        )
+        if publication is None:
+            return None
+        self.comments.insert_one({**comment, "publication_id": ObjectId(publication_id), "parent_id": None})
+        self._invalidate(publication_id)
+        logger.info("Comment %s by %s inserted in DB", comment["_id"], comment["user"],
+                    extra=event("comment.write", publication_id=publication_id, comment_id=str(comment["_id"])))
+        return comment["_id"]
+
+    def insert_one_reply(self, publication_id: str, comment_id: str, reply: dict) -> str or None:
+        if not self.is_visible(publication_id):
+            return None
+        comment = self.comments.find_one_and_update(
+            self._thread_filter(publication_id, comment_id),
+            {"$inc": {"replies_count": 1}},
+            projection={"_id": 1}
+        )
+        if comment is None:
+            return None
+        self.comments.insert_one({**reply, "publication_id": ObjectId(publication_id), "parent_id": comment["_id"]})
+        logger.info("Reply %s by %s inserted in DB", reply["_id"], reply["user"],
+                    extra=event("comment.write", publication_id=publication_id, comment_id=str(reply["_id"])))
+        return str(reply["_id"])
 
     def downvote_one_comment(self, publication_id: str, comment_id: str) -> bool:
-        updated_pub = self.collection.find_one_and_update(
-            {
-                "_id": ObjectId(publication_id),
-                "comments._id": ObjectId(comment_id)
-            },
-            {
-                "$inc": {
-                    "comments.$.likes_count": -1
-                }
-            }
-        )
-        if updated_pub is None:
+        if not self._inc_comment_likes(-1, publication_id, comment_id):
             return False
-        else:
-            print(f'Comment \'{comment_id}\' got -1 like.')
-            return True
+        logger.debug("Comment %s got -1 like", comment_id, extra=event("comment.vote", comment_id=comment_id, delta=-1))
+        return True
 
     def downvote_one_reply(self, publication_id: str, comment_id: str, reply_id: str) -> bool:
-        updated_pub = self.collection.find_one_and_update(
-            {
-                "_id": ObjectId(publication_id),
-                "comments._id": ObjectId(comment_id),
-                "comments.replies._id": ObjectId(reply_id)
-            },
-            {
-                "$inc": {
-                    "replies.$.likes_count": -1
-                }
-            },
-            return_document=ReturnDocument.AFTER
-        )
-        print(updated_pub)
-        if updated_pub is None:
+        if not self._inc_comment_likes(-1, publication_id, comment_id, reply_id):
             return False
-        else:
-            print(f'Reply \'{reply_id}\' got -1 like.')
-            return True
+        logger.debug("Reply %s got -1 like", reply_id, extra=event("comment.vote", comment_id=reply_id, delta=-1))
+        return True
+
+    def bulk_vote(self, deltas: dict[tuple, int]) -> int:
+        """Apply like-count deltas keyed by (publication_id,), (publication_id, comment_id)
+        or (publication_id, comment_id, reply_id) with one unordered bulk_write per collection.
+
+        Each collection is written on its own, so a failure of one never gets the deltas of the other
+        applied twice: raise VoteFlushError holding only the deltas which were not applied.
+        """
+        publication_targets, comment_targets = [], []
+        for target, delta in deltas.items():
+            if delta != 0:
+                (publication_targets if len(target) == 1 else comment_targets).append(target)
+        publication_operations = [UpdateOne({"_id": ObjectId(target[0])}, {"$inc": {"likes_count": deltas[target]}})
+                                  for target in publication_targets]
+        comment_operations = [UpdateOne(self._thread_filter(*target), {"$inc": {"likes_count": deltas[target]}})
+                              for target in comment_targets]
+        modified_count = 0
+        retry, lost, error = {}, {}, None
+        for collection, targets, operations in ((self.collection, publication_targets, publication_operations),
+                                                (self.comments, comment_targets, comment_operations)):
+            if not operations:
+                continue
+            try:
+                modified_count += collection.bulk_write(operations, ordered=False).modified_count
+            except BulkWriteError as e:
+                # The other operations of an unordered bulk_write were applied
+                modified_count += e.details.get("nModified", 0)
+                retry.update((targets[write_error["index"]], deltas[targets[write_error["index"]]])
+                             for write_error in e.details["writeErrors"])
+                error = e
+            except ServerSelectionTimeoutError as e:
+                # No server was reached, nothing was written
+                retry.update((target, deltas[target]) for target in targets)
+                error = e
+            except Exception as e:
+                # The write may have been applied before the error: retrying could count the votes twice
+                lost.update((target, deltas[target]) for target in targets)
+                error = e
+            if collection is self.collection:
+                for target in targets:
+                    self._invalidate(target[0])
+        operations_count = len(publication_operations) + len(comment_operations)
+        if operations_count:
+            logger.debug("%d vote counters flushed, %d documents updated", operations_count, modified_count,
+                         extra=event("vote.flush", operations=operations_count, modified=modified_count))
+        if error is not None:
+            raise VoteFlushError(retry, lost, error)
+        return modified_count
 
     # TODO
     def fav_publication(self) -> bool:
         pass
 
-    def get_publications_since(self, time: datetime) -> list:
-        result = self.collection.find({
-            "publication_date": {'$gte': time}
-        })
-        pubs = []
-        for doc in result:
-            pubs.append(doc)
-        print(str(len(pubs)) + " publications created since " + str(time) + " returned")
-        return pubs
-
-    def upload_image(self, data: bytes) -> ObjectId:
-        print("New image uploaded.")
-        return self.fs.put(data, content_type="image/jpeg")
-
-    def delete_image(self, file_id: str) -> None:
-        print(f"Image {file_id} deleted.")
+    def get_publications_since(self, time: datetime, projection: dict = None,
+                               after: tuple = None, limit: int = None) -> pymongo.cursor.Cursor:
+        logger.debug("Publications created since %s requested", time, extra=event("publication.read", since=time))
+        return self._newest_first({"publication_date": {'$gte': time}}, projection, after, limit)
+
+    def upload_image(self, stream: BinaryIO, max_size: int = None) -> ObjectId:
+        file_id = self.put_stream(stream, max_size, content_type="image/jpeg")
+        logger.info("Image %s uploaded", file_id, extra=event("image.write", file_id=str(file_id)))
+        return file_id
+
+    def put_stream(self, stream: BinaryIO, max_size: int = None, **kwargs) -> ObjectId:
+        """Copy a file-like object into GridFS one chunk at a time, storing its size and sha256."""
+        grid_in = self.fs.new_file(**kwargs)
+        sha256 = hashlib.sha256()
+        size = 0
+        try:
+            while True:
+                data = stream.read(gridfs.DEFAULT_CHUNK_SIZE)
+                if not data:
+                    break
+                size += len(data)
+                if max_size is not None and size > max_size:
+                    raise FileTooLargeError(f"Upload exceeds {max_size} bytes")
+                sha256.update(data)
+                grid_in.write(data)
+        except BaseException:
+            grid_in.abort()
+            raise
+        grid_in.sha256 = sha256.hexdigest()
+        grid_in.close()
+        metrics.GRIDFS_BYTES_IN.inc(size)
+        return grid_in._id
+
+    def delete_image(self, file_id: ObjectId) -> None:
+        logger.info("Image %s deleted", file_id, extra=event("image.write", file_id=str(file_id)))
         self.fs.delete(file_id)
+        self._delete_variants([file_id])
+
+    def _delete_variants(self, file_ids: list[ObjectId]) -> None:
+        """Delete the variants of images, and drop the images and their variants from the image cache"""
+        for variant in self.fs.find({"variant_of": {"$in": file_ids}}):
+            self.fs.delete(variant._id)
+        if self.image_cache is not None:
+            for file_id in file_ids:
+                self.image_cache.invalidate(file_id)
+
+    def cache_image(self, grid_out: gridfs.GridOut, file_id: ObjectId, size: str = None) -> CachedImage:
+        """Read a whole image file (the original `file_id` or its variant `size`) into the image cache"""
+        image = CachedImage(grid_out.read(), grid_out.content_type, grid_out.upload_date)
+        metrics.GRIDFS_BYTES_OUT.inc(len(image.data))
+        self.image_cache.put(file_id, size, image)
+        return image
+
+    def read_image(self, file_id: ObjectId) -> bytes:
+        return self.fs.get(file_id).read()
+
+    def get_image_variant(self, file_id: ObjectId, size: str) -> gridfs.GridOut or None:
+        """Stored variant `size` of an image, None when it has not been generated yet.
+        An image marked by mark_undecodable has no variants: the image itself is returned instead."""
+        return self.fs.find_one({"$or": [{"variant_of": file_id, "variant": size},
+                                         {"_id": file_id, "undecodable": True}]})
+
+    def mark_undecodable(self, file_id: ObjectId) -> None:
+        """Flag an image Pillow cannot decode, so that no variant of it is attempted again"""
+        self.database["fs.files"].update_one({"_id": file_id}, {"$set": {"undecodable": True}})
+        logger.info("Image %s marked as undecodable", file_id, extra=event("image.write", file_id=str(file_id)))
+
+    def store_image_variant(self, file_id: ObjectId, size: str, data: bytes) -> ObjectId or None:
+        """Store a resized copy of an image, linked to it by variant_of and removed with it.
+
+        Return None when the variant was stored meanwhile by another instance, whose copy is kept.
+        """
+        variant_id = ObjectId()
+        try:
+            self.put_stream(io.BytesIO(data), _id=variant_id, content_type="image/jpeg",
+                            variant_of=file_id, variant=size)
+        except gridfs.errors.FileExists:  # the unique variant_of index refused the file document
+            self.fs.delete(variant_id)  # and its chunks, written before it
+            return None
+        logger.debug("Variant %s of image %s stored", size, file_id,
+                     extra=event("image.write", file_id=str(file_id), variant=size, length=len(data)))
+        return variant_id
 
     def set_url(self, publication_id: str, file_id: str) -> None:
         self.collection.find_one_and_update(
@@ -293,37 +643,50 @@ class DBInterface:
                 "$set": {"media_url": f"/api/images/{file_id}"}
             },
         )
+        self._invalidate(publication_id)
 
     def download_image(self, file_id: ObjectId) -> gridfs.GridOut:
-        print(f"{datetime.datetime.now()}: Image {str(file_id)} downloaded.")
+        logger.debug("Image %s downloaded", file_id, extra=event("image.read", file_id=str(file_id)))
         return self.fs.get(file_id)
 
-    def store_like(self, publication_id: str, user: str) -> None:
-        self.database["pub_like_map"].update_one(
-            {"_id": ObjectId(publication_id)},
-            {
-                "$addToSet": {
-                    "user_list": user
-                }
-            }
-        )
-
-    def del_like(self, publication_id: str, user: str) -> None:
-        self.database["pub_like_map"].update_one(
-            {"_id": ObjectId(publication_id)},
-            {
-                "$pull": {
-                    "user_list": user
-                }
-            }
-        )
-
-    def del_like_user_list(self, publication_id) -> None:
-        self.database["pub_like_map"].find_one_and_delete(
-            {
-                "_id": ObjectId(publication_id)
-            }
-        )
+    def like_publication(self, publication_id: str, user: str, update_count: bool = True) -> bool or None:
+        """Record the like of a user and increment likes_count, at most once per user.
+
+        The conditional update of pub_like_map is the atomic gate: of many concurrent likes by the
+        same user only one can modify it, and only that one increments the counter.
+        Return True when the like was recorded, False when it already was, None for an unknown publication.
+        """
+        return self._set_like(publication_id, user, liked=True, update_count=update_count)
+
+    def unlike_publication(self, publication_id: str, user: str, update_count: bool = True) -> bool or None:
+        """Counterpart of like_publication: only a user who liked the publication decrements likes_count."""
+        return self._set_like(publication_id, user, liked=False, update_count=update_count)
+
+    def _set_like(self, publication_id: str, user: str, liked: bool, update_count: bool) -> bool or None:
+        _id = ObjectId(publication_id)
+        if not self.is_visible(publication_id):
+            return None
+        if liked:
+            result = self.database["pub_like_map"].update_one(
+                {"_id": _id, "user_list": {"$ne": user}},
+                {"$addToSet": {"user_list": user}}
+            )
+        else:
+            result = self.database["pub_like_map"].update_one(
+                {"_id": _id, "user_list": user},
+                {"$pull": {"user_list": user}}
+            )
+        if result.modified_count == 0:
+            # Unchanged: tell an already (un)liked publication from a missing one
+            if self.database["pub_like_map"].count_documents({"_id": _id}, limit=1) == 0:
+                return None
+            return False
+        if update_count:
+            self.collection.update_one({"_id": _id, **NOT_DELETED}, {"$inc": {"likes_count": 1 if liked else -1}})
+            self._invalidate(publication_id)
+        logger.debug("Publication %s %s by %s", publication_id, "liked" if liked else "unliked", user,
+                     extra=event("publication.like", publication_id=publication_id, user=user, liked=liked))
+        return True
 
     def is_liked(self, publication_id: str, user: str) -> bool:
         result = self.database["pub_like_map"].count_documents(
@@ -332,53 +695,167 @@ class DBInterface:
                 "user_list": user
              }
         )
-        print(f"Count: {result} of pub found for {publication_id} / {user}")
+        logger.debug("Like of %s by %s checked", publication_id, user,
+                     extra=event("publication.like", publication_id=publication_id, user=user, count=result))
         if result > 0:
             return True
         else:
             return False
 
-    def get_liked_pub(self, user: str) -> list[dict]:
-        pub_list = []
-        cursor = self.database["pub_like_map"].find({"user_list": user})
-        for doc in cursor:
-            pub_list.append(self.get_one_publication(str(doc["_id"])))
-        return pub_list
-
-    def upload_nft(self, data: bytes, wallet: str):
-        print(f"{datetime.datetime.now()}:  New NFT uploaded.")
-        return self.fs.put(data, content_type="image/jpeg", wallet=wallet)
-
-    def get_nft_from_wallet(self, wallet: str) -> list[dict]:
-        url_list = []
-        cursor = self.database["nfts_meta"].find({"wallet": wallet})
-        for file in cursor:
-            file["_id"] = str(file["_id"])
-            file["is_published"] = self.is_published_state(file["_id"])
-            url_list.append(file)
-        print(f"{url_list} returned for {wallet}")
-        return url_list
+    def get_liked_pub(self, user: str, projection: dict = None,
+                      after: tuple = None, limit: int = None) -> pymongo.command_cursor.CommandCursor:
+        """Publications liked by a user, newest first, joined server-side in a single aggregation.
+
+        The page is chosen on the (publication_date, _id) keys of the liked publications alone: the
+        first $lookup fetches only these, by _id, dropping like map entries whose publication no longer
+        exists or is marked as deleted. Only the documents of the page are then looked up in full.
+        """
+        pipeline = [
+            {"$match": {"user_list": user}},
+            {"$project": {"_id": 1}},
+            {"$lookup": {
+                "from": self.collection.name,
+                "let": {"publication_id": "$_id"},
+                "pipeline": [
+                    {"$match": {"$expr": {"$eq": ["$_id", "$$publication_id"]}, **NOT_DELETED}},
+                    {"$project": {"publication_date": 1}}
+                ],
+                "as": "publication"
+            }},
+            {"$unwind": "$publication"},
+            {"$replaceRoot": {"newRoot": "$publication"}},
+        ]
+        if after is not None:
+            pipeline.append({"$match": self._after(after)})
+        pipeline.append({"$sort": {"publication_date": pymongo.DESCENDING, "_id": pymongo.DESCENDING}})
+        if limit is not None:
+            pipeline.append({"$limit": limit})
+        pipeline += [
+            {"$lookup": {
+                "from": self.collection.name,
+                "localField": "_id",
+                "foreignField": "_id",
+                "as": "publication"
+            }},
+            {"$unwind": "$publication"},
+            {"$replaceRoot": {"newRoot": "$publication"}},
+        ]
+        if projection is not None:
+            pipeline.append({"$project": projection})
+        return self.database["pub_like_map"].aggregate(pipeline, allowDiskUse=True)
+
+    def upload_nft(self, stream: BinaryIO, wallet: str, max_size: int = None) -> ObjectId:
+        file_id = self.put_stream(stream, max_size, content_type="image/jpeg", wallet=wallet)
+        logger.info("NFT %s uploaded for %s", file_id, wallet,
+                    extra=event("nft.write", file_id=str(file_id), wallet=wallet))
+        return file_id
+
+    def get_nft_from_wallet(self, wallet: str, after: ObjectId = None, limit: int = None) -> list[dict]:
+        """NFTs of a wallet, newest first and starting after the file id `after`, each flagged
+        with its publish state resolved for the whole page by one $in query."""
+        query = {"wallet": wallet}
+        if after is not None:
+            query["_id"] = {"$lt": after}
+        cursor = self.database["nfts_meta"].find(query).sort("_id", pymongo.DESCENDING)
+        if limit is not None:
+            cursor = cursor.limit(limit)
+        nfts = list(cursor)
+        file_ids = [str(nft["_id"]) for nft in nfts]
+        published = set(self.database["pub_like_map"].distinct("file_id", {"file_id": {"$in": file_ids}}))
+        for nft, file_id in zip(nfts, file_ids):
+            nft["_id"] = file_id
+            nft["is_published"] = file_id in published
+        logger.debug("%d NFTs returned for %s", len(nfts), wallet, extra=event("nft.read", wallet=wallet, count=len(nfts)))
+        return nfts
 
     def nft_set_metadata(self, metadata: dict, file_id: str, wallet: str):
-        self.database["nfts_meta"].insert_one(
-            {
-                "_id": ObjectId(file_id),
-                "wallet": wallet,
-                "metadata": metadata
-            }
+        self.database["nfts_meta"].update_one(
+            {"_id": ObjectId(file_id)},
+            {"$set": {"wallet": wallet, "metadata": metadata}},
+            upsert=True  # the metadata write of a mint job is retried until it succeeds
         )
 
-    def nft_get_metadata(self, file_id: str):
-        return self.database["nfts_meta"].find_one({"_id": ObjectId(file_id)})["metadata"]
+    def create_mint_job(self, file_id: str, wallet: str) -> dict:
+        now = datetime.datetime.now()
+        job = {
+            "_id": ObjectId(),
+            "file_id": file_id,
+            "wallet": wallet,
+            "status": "pending",  # then minting, recording once minted, then minted or dead_lettered
+            "attempts": 0,  # calls to the NFT service
+            "last_error": None,
+            "mint_response": None,  # body of the successful mint, saved before anything else is done with it
+            "created_at": now,
+            "updated_at": now,
+            "minted_at": None,
+            "next_attempt_at": now  # while minting, the end of the lease of the worker
+        }
+        self.mint_jobs.insert_one(job)
+        logger.info("Mint of NFT %s queued", file_id,
+                    extra=event("nft.mint", file_id=file_id, wallet=wallet, job_id=str(job["_id"])))
+        return job
+
+    def get_mint_job(self, job_id: str) -> dict or None:
+        return self.mint_jobs.find_one({"_id": ObjectId(job_id)})
+
+    def claim_mint_job(self, lease: float) -> dict or None:
+        """Take a due job for `lease` seconds: first the minted ones whose metadata is still to be
+        recorded, then the one to mint due the longest, pending or whose worker lost its lease."""
+        now = datetime.datetime.now()
+        job = self.mint_jobs.find_one_and_update(
+            {"status": "recording", "next_attempt_at": {"$lte": now}},
+            {"$set": {"updated_at": now, "next_attempt_at": now + datetime.timedelta(seconds=lease)}},
+            sort=[("next_attempt_at", pymongo.ASCENDING)],
+            return_document=pymongo.ReturnDocument.AFTER
+        )
+        if job is not None:
+            return job
+        return self.mint_jobs.find_one_and_update(
+            {"status": {"$in": ["pending", "minting"]}, "next_attempt_at": {"$lte": now}},
+            {"$set": {"status": "minting", "updated_at": now,
+                      "next_attempt_at": now + datetime.timedelta(seconds=lease)},
+             "$inc": {"attempts": 1}},
+            sort=[("next_attempt_at", pymongo.ASCENDING)],
+            return_document=pymongo.ReturnDocument.AFTER
+        )
 
-    def is_published_state(self, file_id) -> bool:
-        if self.database["pub_like_map"].find_one({"file_id": file_id}) is None:
-            return False
+    def record_mint(self, job: dict, mint_response: str) -> None:
+        """Save the answer of a successful mint: from then on only its metadata write is retried, never the mint"""
+        self.mint_jobs.update_one(
+            {"_id": job["_id"]},
+            {"$set": {"status": "recording", "updated_at": datetime.datetime.now(), "mint_response": mint_response}}
+        )
+
+    def complete_mint_job(self, job: dict, metadata: dict) -> None:
+        self.nft_set_metadata(metadata=metadata, file_id=job["file_id"], wallet=job["wallet"])
+        now = datetime.datetime.now()
+        self.mint_jobs.update_one(
+            {"_id": job["_id"]},
+            {"$set": {"status": "minted", "updated_at": now, "minted_at": now, "last_error": None}}
+        )
+
+    def fail_mint_job(self, job: dict, error: str, retry_at: datetime.datetime = None) -> None:
+        """Record a failed attempt: the job is retried at `retry_at`, or dead-lettered without one"""
+        update = {"updated_at": datetime.datetime.now(), "last_error": error}
+        if retry_at is None:
+            update["status"] = "dead_lettered"
         else:
-            return True
+            update.update(status="pending", next_attempt_at=retry_at)
+        self.mint_jobs.update_one({"_id": job["_id"]}, {"$set": update})
+
+    def nft_get_metadata(self, file_id: str):
+        return self.database["nfts_meta"].find_one({"_id": ObjectId(file_id)})["metadata"]
 
     def clean_database(self) -> None:
         self.collection.delete_many({})
+        if self.cache is not None:
+            self.cache.clear()
+        self.comments.delete_many({})
+        if self.image_cache is not None:
+            self.image_cache.clear()
+        self.hashtag_counts.delete_many({})
+        self.deletion_jobs.delete_many({})
+        self.mint_jobs.delete_many({})
         self.database["nfts_meta"].delete_many({})
         self.database["pub_like_map"].delete_many({})
         self.database["fs.files"].delete_many({})
@@ -0,0 +1,75 @@
+import asyncio
+import logging
+
+from classes.async_database_interface import AsyncDBInterface
+from classes.structured_logging import event
+
+logger = logging.getLogger(__name__)
+
+
+class DeletionWorker:
+    """Background purge of the publications marked as deleted.
+
+    Deletion jobs are claimed from the deletion_jobs collection with a lease, so that with several
+    instances each job has a single worker and the job of a dead instance is taken over once its
+    lease expires. A job is purged `batch_size` publications at a time with a pause of
+    `batch_interval` seconds after each batch, which bounds the write load put on MongoDB.
+    """
+
+    def __init__(self, mongodb_interface: AsyncDBInterface, batch_size: int, batch_interval: float,
+                 poll_interval: float, lease: float = 60):
+        self.mongodb_interface = mongodb_interface
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self._task = None
+        self.stats = {
+            "jobs_done": 0,
+            "publications_purged": 0,
+            "files_deleted": 0,
+            "errors": 0
+        }
+
+    async def purge(self, job: dict) -> None:
+        while True:
+            publications = await self.mongodb_interface.get_deleted_publications(job["target"], self.batch_size)
+            if not publications:
+                break
+            files_deleted = await self.mongodb_interface.purge_publications(publications)
+            await self.mongodb_interface.advance_deletion_job(job["_id"], len(publications), self.lease)
+            self.stats["publications_purged"] += len(publications)
+            self.stats["files_deleted"] += files_deleted
+            await asyncio.sleep(self.batch_interval)
+        await self.mongodb_interface.finish_deletion_job(job["_id"])
+        self.stats["jobs_done"] += 1
+        logger.info("Deletion job %s done", job["_id"],
+                    extra=event("deletion.job", job_id=str(job["_id"]), kind=job["kind"]))
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                job = await self.mongodb_interface.claim_deletion_job(self.lease)
+                if job is None:
+                    await asyncio.sleep(self.poll_interval)
+                    continue
+                await self.purge(job)
+            except Exception as e:
+                # The job is taken over once its lease expires
+                self.stats["errors"] += 1
+                logger.error("Deletion job failed: %s", e)
+                await asyncio.sleep(self.poll_interval)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def metrics(self) -> dict:
+        return dict(self.stats)
@@ -0,0 +1,58 @@
+import datetime
+from typing import NamedTuple
+
+from bson import ObjectId
+
+from classes.byte_budget_lru import ByteBudgetLRU
+
+
+class CachedImage(NamedTuple):
+    data: bytes
+    content_type: str
+    upload_date: datetime.datetime
+
+    def view(self, start: int, end: int) -> memoryview:
+        """Bytes [start, end] of the image, without copying them"""
+        return memoryview(self.data)[start:end + 1]
+
+
+class ImageCache(ByteBudgetLRU):
+    """LRU cache of image files (originals and their variants) with a TTL and a memory budget.
+
+    Only files of at most `max_item_bytes` are admitted, so that a few large originals cannot evict
+    the many small previews the feeds request. Images never change under a file id: the TTL only
+    bounds how long another instance keeps serving an image deleted elsewhere.
+    """
+
+    def __init__(self, max_bytes: int, max_item_bytes: int, ttl: float):
+        super().__init__(max_bytes, ttl)
+        self.max_item_bytes = min(max_item_bytes, max_bytes)
+        self.stats["bytes_saved"] = 0
+
+    def admits(self, length: int) -> bool:
+        return length <= self.max_item_bytes
+
+    def get(self, file_id: ObjectId, size: str = None) -> CachedImage or None:
+        return self.lookup((file_id, size))
+
+    def count_served(self, length: int) -> None:
+        """Record `length` bytes sent from the cache rather than read from GridFS"""
+        with self.lock:
+            self.stats["bytes_saved"] += length
+
+    def put(self, file_id: ObjectId, size: str, image: CachedImage) -> None:
+        if not self.admits(len(image.data)):
+            return
+        with self.lock:
+            self._store((file_id, size), image, len(image.data))
+
+    def invalidate(self, file_id: ObjectId) -> None:
+        """Drop an image and all of its variants"""
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == file_id]:
+                self._invalidate(key)
+
+    def metrics(self) -> dict:
+        metrics = super().metrics()
+        requests = metrics["hits"] + metrics["misses"]
+        return {**metrics, "hit_ratio": metrics["hits"] / requests if requests else 0.0}
@@ -0,0 +1,256 @@
+"""Index registry, versioned migrations and query-plan checks of the publications service.
+
+Usage (from src/, with the same environment as the service):
+    python -m classes.index_manager indexes   # create every registered index (idempotent)
+    python -m classes.index_manager migrate   # apply the pending migrations in version order
+    python -m classes.index_manager check     # explain() every hot query, exit 1 on any COLLSCAN
+"""
+import argparse
+import datetime
+import logging
+import sys
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from classes.database_interface import (DELETION_JOB_RETENTION_HOURS, HASHTAG_COUNT_RETENTION_HOURS,
+                                        MINT_JOB_RETENTION_HOURS, DBInterface)
+from classes import structured_logging
+
+from utils.document_builders import normalize_hashtag
+
+logger = logging.getLogger(__name__)
+
+PUBLICATIONS = "publications"  # resolved to DBInterface.collection, whose name depends on the deployment
+
+INDEXES = {
+    PUBLICATIONS: [
+        IndexModel([("publication_date", DESCENDING), ("_id", DESCENDING)], name="publication_date"),
+        IndexModel([("user_name", ASCENDING), ("publication_date", DESCENDING), ("_id", DESCENDING)],
+                   name="user_name_publication_date"),
+        IndexModel([("hashtags", ASCENDING), ("publication_date", DESCENDING), ("_id", DESCENDING)],
+                   name="hashtags_publication_date"),
+    ],
+    "pub_like_map": [
+        IndexModel([("user_list", ASCENDING)], name="user_list"),
+        IndexModel([("file_id", ASCENDING)], name="file_id"),
+    ],
+    "comments": [
+        IndexModel([("publication_id", ASCENDING), ("parent_id", ASCENDING),
+                    ("publication_date", ASCENDING), ("_id", ASCENDING)], name="thread"),
+    ],
+    "hashtag_counts": [
+        IndexModel([("hour", ASCENDING)], name="hour_ttl", expireAfterSeconds=HASHTAG_COUNT_RETENTION_HOURS * 3600),
+    ],
+    "nfts_meta": [
+        IndexModel([("wallet", ASCENDING), ("_id", DESCENDING)], name="wallet_id"),
+    ],
+    "fs.files": [
+        # one copy per variant, even when instances generate it concurrently; originals, which have
+        # neither field, are left out by sparse (a partialFilterExpression would be ignored by mongomock)
+        IndexModel([("variant_of", ASCENDING), ("variant", ASCENDING)], name="variant_of", unique=True, sparse=True),
+    ],
+    "deletion_jobs": [
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING)], name="status_created_at"),
+        # pending and running jobs have no finished_at date, only done ones expire
+        IndexModel([("finished_at", ASCENDING)], name="finished_at_ttl",
+                   expireAfterSeconds=DELETION_JOB_RETENTION_HOURS * 3600),
+    ],
+    "mint_jobs": [
+        IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)], name="status_next_attempt_at"),
+        # only minted jobs have a minted_at date, the dead-lettered ones stay for inspection
+        IndexModel([("minted_at", ASCENDING)], name="minted_at_ttl",
+                   expireAfterSeconds=MINT_JOB_RETENTION_HOURS * 3600),
+    ],
+}
+
+# (name, collection, filter) of every query the service runs on a request path
+HOT_QUERIES = [
+    ("get_publications_since", PUBLICATIONS, {"publication_date": {"$gte": datetime.datetime(2000, 1, 1)}}),
+    ("get_user_publications", PUBLICATIONS, {"user_name": "foo"}),
+    ("get_hashtag_publications", PUBLICATIONS, {"hashtags": "foo"}),
+    ("get_top_hashtags", "hashtag_counts", {"hour": {"$gte": datetime.datetime(2000, 1, 1)}}),
+    ("is_liked", "pub_like_map", {"_id": ObjectId(), "user_list": "foo"}),
+    ("get_liked_pub", "pub_like_map", {"user_list": "foo"}),
+    ("get_nft_from_wallet.is_published", "pub_like_map", {"file_id": {"$in": [str(ObjectId())]}}),
+    ("get_nft_from_wallet", "nfts_meta", {"wallet": "0x0"}),
+    ("get_comments", "comments", {"publication_id": ObjectId(), "parent_id": None}),
+    ("get_replies", "comments", {"publication_id": ObjectId(), "parent_id": ObjectId()}),
+    ("get_image_variant", "fs.files", {"$or": [{"variant_of": ObjectId(), "variant": "small"},
+                                               {"_id": ObjectId(), "undecodable": True}]}),
+    ("claim_deletion_job", "deletion_jobs", {"status": {"$in": ["pending", "running"]}}),
+    ("claim_mint_job", "mint_jobs", {"status": {"$in": ["pending", "minting", "recording"]},
+                                     "next_attempt_at": {"$lte": datetime.datetime(2000, 1, 1)}}),
+]
+
+
+def drop_nfts_meta_wallet_index(db_interface: DBInterface) -> None:
+    nfts_meta = db_interface.database["nfts_meta"]
+    if "wallet" in nfts_meta.index_information():
+        nfts_meta.drop_index("wallet")
+
+
+MIGRATION_BATCH_SIZE = 500
+DUPLICATE_KEY_ERROR = 11000
+
+
+def move_embedded_comments(db_interface: DBInterface) -> None:
+    """Move the embedded comments/replies of every publication to the comments collection, in batches.
+
+    Publications are paged by _id, so each batch starts where the previous one ended instead of
+    scanning the migrated publications again. Comments keep their _id, so a run interrupted
+    between the insert and the $unset is resumed by skipping the duplicates already inserted.
+    """
+    moved = 0
+    last_id = None
+    while True:
+        query = {"comments": {"$exists": True}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = list(db_interface.collection.find(query, {"comments": 1})
+                     .sort("_id", ASCENDING).limit(MIGRATION_BATCH_SIZE))
+        if not batch:
+            break
+        last_id = batch[-1]["_id"]
+        documents = []
+        updates = []
+        for publication in batch:
+            documents += db_interface.thread_documents(publication["_id"], publication["comments"])
+            updates.append(UpdateOne(
+                {"_id": publication["_id"], "comments": {"$exists": True}},
+                # $inc keeps the comments posted to the collection since the deployment
+                {"$unset": {"comments": ""}, "$inc": {"comments_count": len(publication["comments"])}}
+            ))
+        if documents:
+            try:
+                db_interface.comments.insert_many(documents, ordered=False)
+            except BulkWriteError as e:
+                if any(error["code"] != DUPLICATE_KEY_ERROR for error in e.details["writeErrors"]):
+                    raise
+        db_interface.collection.bulk_write(updates, ordered=False)
+        for publication in batch:
+            db_interface._invalidate(publication["_id"])
+        moved += len(batch)
+        logger.info("Comment threads of %d publications moved", moved)
+
+
+def normalize_stored_hashtags(db_interface: DBInterface) -> None:
+    """Rewrite the hashtags of publications and comments extracted before normalization ('#Cat!' -> 'cat')"""
+    for collection in (db_interface.collection, db_interface.comments):
+        updates = []
+        for document in collection.find({"hashtags.0": {"$exists": True}}, {"hashtags": 1}):
+            hashtags = list(dict.fromkeys(filter(None, map(normalize_hashtag, document["hashtags"]))))
+            if hashtags != document["hashtags"]:
+                updates.append(UpdateOne({"_id": document["_id"]}, {"$set": {"hashtags": hashtags}}))
+            if len(updates) == MIGRATION_BATCH_SIZE:
+                collection.bulk_write(updates, ordered=False)
+                updates = []
+        if updates:
+            collection.bulk_write(updates, ordered=False)
+    if db_interface.cache is not None:
+        db_interface.cache.clear()
+
+
+def count_recent_hashtags(db_interface: DBInterface) -> None:
+    """Fill the hourly hashtag counts with the publications of the retention window.
+
+    Counts are set, not incremented, so publications counted since the deployment are not counted twice.
+    """
+    since = datetime.datetime.now() - datetime.timedelta(hours=HASHTAG_COUNT_RETENTION_HOURS)
+    publications = db_interface.collection.find({"publication_date": {"$gte": since}},
+                                                {"hashtags": 1, "publication_date": 1})
+    updates = [
+        db_interface.hashtag_count_update(hashtag, hour, {"$set": {"count": count}}, upsert=True)
+        for (hashtag, hour), count in db_interface.hashtag_counts_by_hour(publications).items()
+    ]
+    for start in range(0, len(updates), MIGRATION_BATCH_SIZE):
+        db_interface.hashtag_counts.bulk_write(updates[start:start + MIGRATION_BATCH_SIZE], ordered=False)
+    logger.info("%d hourly hashtag counts written", len(updates))
+
+
+# (version, description, function(DBInterface)), applied once each in version order
+MIGRATIONS = [
+    (1, "Drop the nfts_meta wallet index, superseded by wallet_id", drop_nfts_meta_wallet_index),
+    (2, "Move embedded comments and replies to the comments collection", move_embedded_comments),
+    (3, "Normalize the stored hashtags", normalize_stored_hashtags),
+    (4, "Count the hashtags of the recent publications", count_recent_hashtags),
+]
+
+MIGRATIONS_COLLECTION = "schema_migrations"
+
+
+def get_collection(db_interface: DBInterface, name: str):
+    if name == PUBLICATIONS:
+        return db_interface.collection
+    return db_interface.database[name]
+
+
+def apply_indexes(db_interface: DBInterface) -> dict[str, list[str]]:
+    created = {}
+    for collection_name, indexes in INDEXES.items():
+        created[collection_name] = get_collection(db_interface, collection_name).create_indexes(indexes)
+    logger.info("Indexes ensured: %s", created)
+    return created
+
+
+def migrate(db_interface: DBInterface) -> list[int]:
+    history = db_interface.database[MIGRATIONS_COLLECTION]
+    applied_versions = {doc["_id"] for doc in history.find({}, {"_id": 1})}
+    applied_now = []
+    for version, description, migration in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if version in applied_versions:
+            continue
+        logger.info("Applying migration %d: %s", version, description)
+        migration(db_interface)
+        history.insert_one({
+            "_id": version,
+            "description": description,
+            "applied_at": datetime.datetime.now()
+        })
+        applied_now.append(version)
+    logger.info("%d migration(s) applied.", len(applied_now))
+    return applied_now
+
+
+def _stages(plan: dict):
+    yield plan.get("stage")
+    if "inputStage" in plan:
+        yield from _stages(plan["inputStage"])
+    for input_stage in plan.get("inputStages", []):
+        yield from _stages(input_stage)
+
+
+def check_hot_queries(db_interface: DBInterface) -> list[str]:
+    """Return the name of every hot query whose winning plan contains a COLLSCAN."""
+    collection_scans = []
+    for name, collection_name, query in HOT_QUERIES:
+        plan = get_collection(db_interface, collection_name).find(query).explain()["queryPlanner"]["winningPlan"]
+        if "COLLSCAN" in _stages(plan):
+            collection_scans.append(name)
+            logger.error("%s runs a COLLSCAN on %s", name, collection_name)
+        else:
+            logger.info("%s uses an index", name)
+    return collection_scans
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["indexes", "migrate", "check"])
+    args = parser.parse_args()
+
+    structured_logging.configure_logging()
+    db_interface = DBInterface()
+    try:
+        if args.command == "indexes":
+            apply_indexes(db_interface)
+        elif args.command == "migrate":
+            migrate(db_interface)
+        elif check_hot_queries(db_interface):
+            sys.exit(1)
+    finally:
+        structured_logging.stop_logging()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Prometheus metrics of the publications service, exposed in text format by GET /metrics.
+
+Recording a sample is a dict lookup of its label child (bound once for DB methods and GridFS)
+and a lock-protected add: cheap enough to leave on in production.
+"""
+import functools
+import time
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, disable_created_metrics,
+                               generate_latest)
+from prometheus_client.core import GaugeMetricFamily
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+disable_created_metrics()  # one *_created series per label set would double the scrape size
+
+# its _count series is the request count
+HTTP_DURATION = Histogram(
+    "http_request_duration_seconds", "Time to send the whole response, by route template and status.",
+    ["method", "route", "status"]
+)
+DB_DURATION = Histogram(
+    "db_method_duration_seconds",
+    "Duration of DBInterface methods. Query methods returning a cursor only cover building it, "
+    "their iteration is timed as to_list.",
+    ["method"],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5)
+)
+DB_ERRORS = Counter("db_method_errors_total", "DBInterface method calls that raised.", ["method"])
+GRIDFS_BYTES = Counter("gridfs_bytes_total", "Bytes written to (in) and streamed from (out) GridFS.", ["direction"])
+OUTBOUND_DURATION = Histogram(
+    "outbound_request_duration_seconds",
+    "Calls to TrendTracker and the NFT service, retries included, by outcome "
+    "(status code, error or circuit_open).",
+    ["service", "method", "outcome"]
+)
+
+GRIDFS_BYTES_IN = GRIDFS_BYTES.labels("in")
+GRIDFS_BYTES_OUT = GRIDFS_BYTES.labels("out")
+
+UNMATCHED_ROUTE = "unmatched"  # keeps the label count bounded whatever path is requested
+
+
+def timed(name: str, func):
+    duration = DB_DURATION.labels(name)
+    errors = DB_ERRORS.labels(name)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except BaseException:
+            errors.inc()
+            raise
+        finally:
+            duration.observe(time.perf_counter() - start)
+
+    return wrapper
+
+
+def instrument_methods(cls):
+    """Class decorator timing every public method, by name, in DB_DURATION and DB_ERRORS"""
+    for name, attr in list(vars(cls).items()):
+        if not name.startswith("_") and callable(attr) and not isinstance(attr, (staticmethod, classmethod)):
+            setattr(cls, name, timed(name, attr))
+    return cls
+
+
+def count_bytes(chunks, counter):
+    """Pass the chunks of a byte stream through, adding their size to `counter`"""
+    for chunk in chunks:
+        counter.inc(len(chunk))
+        yield chunk
+
+
+class StatsCollector:
+    """Expose the numeric `metrics()` values of a component (vote aggregator, publication cache) as gauges"""
+
+    def __init__(self, prefix: str, get_stats):
+        self.prefix = prefix
+        self.get_stats = get_stats
+
+    def collect(self):
+        stats = self.get_stats()
+        for key, value in (stats or {}).items():
+            if isinstance(value, (int, float)):
+                yield GaugeMetricFamily(f"{self.prefix}_{key}", f"{self.prefix} {key.replace('_', ' ')}", value=value)
+
+
+def register_stats(prefix: str, get_stats) -> None:
+    REGISTRY.register(StatsCollector(prefix, get_stats))
+
+
+def render() -> tuple[bytes, str]:
+    """Body and content type of the /metrics response"""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+class RequestMetricsMiddleware:
+    """Count and time every HTTP request by route template (/get_publication_by_id/{publication_id}), not path"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status_code = 500  # when the app raises before answering
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")  # set by FastAPI's router on the shared scope
+            HTTP_DURATION.labels(
+                scope["method"], route.path if route is not None else UNMATCHED_ROUTE, str(status_code)
+            ).observe(time.perf_counter() - start)
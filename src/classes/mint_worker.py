@@ -0,0 +1,152 @@
+import asyncio
+import datetime
+import json
+import logging
+import random
+
+import httpx
+
+from classes.async_database_interface import AsyncDBInterface
+from classes.service_client import CircuitOpenError
+from classes.structured_logging import event
+
+logger = logging.getLogger(__name__)
+
+
+class MintWorker:
+    """Pool of `concurrency` workers minting the NFTs queued in the mint_jobs collection.
+
+    `mint(file_id, wallet)` calls the NFT service. A failed attempt is retried after an exponential
+    backoff with full jitter (`backoff` * 2 ** (attempt - 1) seconds at most, capped at `max_backoff`);
+    after `max_attempts`, or on a 4xx answer which no retry would change, the job is dead-lettered.
+    Jobs are claimed with a lease of `lease` seconds: the job of a dead worker is retried once it expires.
+
+    A mint is not idempotent, so the answer of a successful one is saved in its job before it is even
+    parsed. From then on the job is only retried to record the metadata, the NFT service is not called again.
+    """
+
+    def __init__(self, mongodb_interface: AsyncDBInterface, mint, concurrency: int, max_attempts: int,
+                 backoff: float, max_backoff: float, poll_interval: float, lease: float):
+        self.mongodb_interface = mongodb_interface
+        self.mint = mint
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self._queued = asyncio.Event()
+        self._tasks = []
+        self.in_flight = 0
+        self.stats = {
+            "minted": 0,
+            "retries": 0,
+            "dead_lettered": 0,
+            "errors": 0
+        }
+
+    def notify(self) -> None:
+        """Wake an idle worker up for a job just queued, rather than waiting for the next poll"""
+        self._queued.set()
+
+    def backoff_delay(self, attempts: int) -> float:
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempts - 1)))
+
+    def retry_at(self, attempts: int) -> datetime.datetime:
+        return datetime.datetime.now() + datetime.timedelta(seconds=self.backoff_delay(attempts))
+
+    async def save_mint(self, job: dict, mint_response: str) -> None:
+        """Save the answer of a successful mint, insisting: a failure here would get the NFT minted twice"""
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                await self.mongodb_interface.record_mint(job, mint_response)
+                return
+            except Exception as e:
+                if attempt == self.max_attempts:
+                    logger.critical("NFT %s minted but not saved, it will be minted again: %s", job["file_id"], e,
+                                    extra=event("nft.mint", file_id=job["file_id"], job_id=str(job["_id"]),
+                                                response=mint_response))
+                    raise
+                await asyncio.sleep(self.backoff_delay(attempt))
+
+    async def record(self, job: dict, mint_response: str) -> None:
+        """Write the metadata of a minted NFT; a failure leaves the job to record again once its lease expires"""
+        try:
+            metadata = json.loads(mint_response)
+        except ValueError:
+            await self.mongodb_interface.fail_mint_job(job, f"Minted, but the answer is not JSON: {mint_response}")
+            self.stats["dead_lettered"] += 1
+            logger.error("NFT %s minted with a non-JSON answer, dead-lettered", job["file_id"],
+                         extra=event("nft.mint", file_id=job["file_id"], job_id=str(job["_id"])))
+            return
+        await self.mongodb_interface.complete_mint_job(job, metadata)
+        self.stats["minted"] += 1
+        logger.info("NFT %s minted", job["file_id"],
+                    extra=event("nft.mint", file_id=job["file_id"], job_id=str(job["_id"]),
+                                attempts=job["attempts"], response=mint_response))
+
+    async def process(self, job: dict) -> None:
+        file_id = job["file_id"]
+        if job["status"] == "recording":  # minted already
+            await self.record(job, job["mint_response"])
+            return
+        permanent = False
+        try:
+            response = await self.mint(file_id, job["wallet"])
+        except (httpx.HTTPError, CircuitOpenError) as e:
+            error = repr(e)
+        else:
+            if response.status_code == 200:
+                await self.save_mint(job, response.text)
+                await self.record(job, response.text)
+                return
+            error = f"{response.status_code}: {response.text}"
+            permanent = 400 <= response.status_code < 500
+        if permanent or job["attempts"] >= self.max_attempts:
+            await self.mongodb_interface.fail_mint_job(job, error)
+            self.stats["dead_lettered"] += 1
+            logger.error("NFT %s dead-lettered after %d attempt(s): %s", file_id, job["attempts"], error,
+                         extra=event("nft.mint", file_id=file_id, job_id=str(job["_id"]), attempts=job["attempts"]))
+        else:
+            await self.mongodb_interface.fail_mint_job(job, error, self.retry_at(job["attempts"]))
+            self.stats["retries"] += 1
+            logger.warning("NFT %s mint attempt %d failed: %s", file_id, job["attempts"], error,
+                           extra=event("nft.mint", file_id=file_id, job_id=str(job["_id"]), attempts=job["attempts"]))
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                job = await self.mongodb_interface.claim_mint_job(self.lease)
+                if job is None:
+                    try:
+                        await asyncio.wait_for(self._queued.wait(), self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    self._queued.clear()
+                    continue
+                self.in_flight += 1
+                try:
+                    await self.process(job)
+                finally:
+                    self.in_flight -= 1
+            except Exception as e:
+                # A job left minting is retried once its lease expires, a job left recording is only recorded
+                self.stats["errors"] += 1
+                logger.error("Mint worker failed: %s", e)
+                await asyncio.sleep(self.poll_interval)
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    def metrics(self) -> dict:
+        return {"in_flight": self.in_flight, **self.stats}
@@ -0,0 +1,57 @@
+from collections import OrderedDict
+
+import bson
+
+from classes.byte_budget_lru import ByteBudgetLRU
+
+
+class PublicationCache(ByteBudgetLRU):
+    """LRU cache of publications with a TTL and a memory budget.
+
+    Publications are stored BSON-encoded: the budget counts their real size, and every hit decodes
+    a fresh copy that callers are free to mutate.
+    A read takes a ticket before querying MongoDB. A write leaves a tombstone holding a later ticket
+    on its publication only, so a read of that publication in flight during the write is not cached
+    afterwards, while reads of every other publication still are.
+    Past `max_tombstones` the oldest tombstones are forgotten and their ticket becomes the horizon:
+    reads which started before it are not cached either.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float, max_tombstones: int = 10000):
+        super().__init__(max_bytes, ttl)
+        self.tickets = 0
+        self.tombstones: OrderedDict[str, int] = OrderedDict()  # publication id: ticket of its last write
+        self.max_tombstones = max_tombstones
+        self.horizon = 0
+
+    def get(self, publication_id: str) -> dict or None:
+        data = self.lookup(publication_id)
+        return bson.BSON(data).decode() if data is not None else None
+
+    def ticket(self) -> int:
+        """Ticket of a read about to query MongoDB, to give back to put"""
+        with self.lock:
+            return self.tickets
+
+    def put(self, publication_id: str, publication: dict, ticket: int) -> None:
+        data = bson.BSON.encode(publication)
+        with self.lock:
+            if ticket < self.horizon or self.tombstones.get(publication_id, -1) > ticket:
+                return  # written since the read started
+            self._store(publication_id, data, len(data))
+
+    def invalidate(self, publication_id: str) -> None:
+        with self.lock:
+            self.tickets += 1
+            self.tombstones[publication_id] = self.tickets
+            self.tombstones.move_to_end(publication_id)
+            if len(self.tombstones) > self.max_tombstones:
+                _, self.horizon = self.tombstones.popitem(last=False)
+            self._invalidate(publication_id)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.tickets += 1
+            self.horizon = self.tickets
+            self.tombstones.clear()
+            self._clear()
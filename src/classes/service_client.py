@@ -0,0 +1,119 @@
+import asyncio
+import random
+import time
+
+import httpx
+
+from classes.metrics import OUTBOUND_DURATION
+
+RETRYABLE_STATUS_CODES = {502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a service that failed too many times in a row."""
+
+
+class ServiceClient:
+    """Pooled async HTTP client of one remote service (TrendTracker, NFT minting).
+
+    Connections are kept alive and shared by every request. Failed calls are retried with exponential
+    backoff and full jitter: idempotent requests on any transport error or 502/503/504, other requests
+    only when the connection could not be established, so a mint is never sent twice.
+    After `failure_threshold` failed calls in a row the circuit opens: calls fail fast with
+    CircuitOpenError for `reset_timeout` seconds. It then turns half-open: the next call is sent as
+    the single trial, every other call keeps failing fast until the trial decides whether it closes.
+    """
+
+    def __init__(self, base_url: str, timeout: float, retries: int = 2, backoff: float = 0.1,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0, max_connections: int = 100,
+                 transport: httpx.AsyncBaseTransport = None, name: str = None):
+        self.base_url = base_url
+        self.name = name or base_url  # "service" label of the outbound metrics
+        self.retries = retries
+        self.backoff = backoff
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probing = False  # a half-open trial call is in flight
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            transport=transport
+        )
+
+    @property
+    def is_open(self) -> bool:
+        """Whether a call would fail fast: open, or half-open with the trial call already in flight"""
+        return self.opened_at is not None and (
+            self.probing or time.monotonic() - self.opened_at < self.reset_timeout)
+
+    def _record(self, success: bool) -> None:
+        if success:
+            self.consecutive_failures = 0
+            self.opened_at = None
+        else:
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()  # (re)open, also after a failed trial call
+
+    async def request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            response = await self._request(method, path, **kwargs)
+            outcome = str(response.status_code)
+            return response
+        except CircuitOpenError:
+            outcome = "circuit_open"
+            raise
+        finally:
+            OUTBOUND_DURATION.labels(self.name, method.upper(), outcome).observe(time.perf_counter() - start)
+
+    async def _request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        if self.is_open:
+            raise CircuitOpenError(f"{self.base_url} is unavailable, circuit open")
+        if self.opened_at is None:
+            return await self._send(method, path, **kwargs)
+        self.probing = True  # half-open: this call is the trial
+        try:
+            return await self._send(method, path, **kwargs)
+        finally:
+            # Recorded as a success or a failure, or cancelled: the next call may be the trial
+            self.probing = False
+
+    async def _send(self, method: str, path: str, **kwargs) -> httpx.Response:
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            try:
+                response = await self.client.request(method, path, **kwargs)
+                if not (idempotent and response.status_code in RETRYABLE_STATUS_CODES):
+                    self._record(success=response.status_code < 500)
+                    return response
+                error = None
+            except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+                error = e
+            except httpx.TransportError as e:
+                if not idempotent:
+                    self._record(success=False)
+                    raise
+                error = e
+            if attempt >= self.retries:
+                self._record(success=False)
+                if error is not None:
+                    raise error
+                return response
+            await asyncio.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+            attempt += 1
+
+    async def get(self, path: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", path, **kwargs)
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
@@ -0,0 +1,53 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class StaleWhileRevalidate:
+    """Cache the result of a coroutine function and refresh it in the background.
+
+    The first call waits for `fetch`. Afterwards the last good value is always returned at once:
+    when it is older than `ttl` seconds one background refresh is started, and if that refresh
+    fails the stale value keeps being served until a later one succeeds.
+    """
+
+    def __init__(self, fetch, ttl: float):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.value = None
+        self.fetched_at = None
+        self.stats = {"hits": 0, "stale_hits": 0, "refreshes": 0, "refresh_errors": 0}
+        self._lock = asyncio.Lock()
+        self._refresh_task = None
+
+    @property
+    def has_value(self) -> bool:
+        return self.fetched_at is not None
+
+    async def get(self):
+        if not self.has_value:
+            async with self._lock:
+                if not self.has_value:  # another request may have fetched it meanwhile
+                    await self._refresh()
+            return self.value
+        if time.monotonic() - self.fetched_at < self.ttl:
+            self.stats["hits"] += 1
+        else:
+            self.stats["stale_hits"] += 1
+            if self._refresh_task is None or self._refresh_task.done():
+                self._refresh_task = asyncio.create_task(self._background_refresh())
+        return self.value
+
+    async def _refresh(self) -> None:
+        self.value = await self.fetch()
+        self.fetched_at = time.monotonic()
+        self.stats["refreshes"] += 1
+
+    async def _background_refresh(self) -> None:
+        try:
+            await self._refresh()
+        except Exception as e:
+            self.stats["refresh_errors"] += 1
+            logger.error("Background refresh failed, serving stale value: %r", e)
@@ -0,0 +1,134 @@
+"""Structured, non-blocking logging of the publications service.
+
+Records are put on an in-memory queue by the calling thread and written to stdout by a single
+background thread, so a slow stdout never blocks a request or a DB thread.
+
+Configured from the environment:
+    LOG_LEVEL         DEBUG, INFO (default), WARNING, ERROR or CRITICAL, for the loggers of the service
+                      (libraries stay at INFO or above); an unknown level falls back to INFO
+    LOG_FORMAT        json (default), one object per line, or text
+    LOG_SAMPLE_RATES  share of records kept per event below WARNING, e.g.
+                      "publication.like=0.01,comment.vote=0.01,publication.read=0.1"
+                      (default: keep everything)
+"""
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json")
+LOG_SAMPLE_RATES = os.environ.get("LOG_SAMPLE_RATES", "")
+LOG_LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")
+
+SERVICE_LOGGERS = ("main", "classes", "utils")
+
+_listener: logging.handlers.QueueListener = None
+
+
+def event(name: str, **fields) -> dict:
+    """`extra` of a log call: the event name, used for sampling, and its structured fields"""
+    return {"event": name, "fields": fields}
+
+
+def parse_sample_rates(rates: str) -> dict[str, float]:
+    sample_rates = {}
+    for item in filter(None, (item.strip() for item in rates.split(","))):
+        name, _, rate = item.partition("=")
+        sample_rates[name.strip()] = float(rate)
+    return sample_rates
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a random share of the records of the sampled events; warnings and errors are always kept"""
+
+    def __init__(self, sample_rates: dict[str, float]):
+        super().__init__()
+        self.sample_rates = sample_rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = self.sample_rates.get(getattr(record, "event", None))
+        if rate is None or record.levelno >= logging.WARNING:
+            return True
+        if rate < 1:
+            record.sample_rate = rate
+        return random.random() < rate
+
+
+class JSONFormatter(logging.Formatter):
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        if hasattr(record, "event"):
+            entry["event"] = record.event
+            entry.update(record.fields)
+        if hasattr(record, "sample_rate"):
+            entry["sample_rate"] = record.sample_rate
+        if record.exc_text:  # formatted by _QueueHandler.prepare
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler leaving the formatting to the listener thread (the stdlib one formats in the caller)"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class _TextFormatter(logging.Formatter):
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        if hasattr(record, "event"):
+            line += " " + " ".join(f"{key}={value}" for key, value in record.fields.items())
+        return line
+
+
+def configure_logging() -> None:
+    """Route every logger of the process through the queue; calling it again has no effect"""
+    global _listener
+    if _listener is not None:
+        return
+    output = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == "text":
+        output.setFormatter(_TextFormatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    else:
+        output.setFormatter(JSONFormatter())
+
+    log_queue = queue.SimpleQueue()
+    handler = _QueueHandler(log_queue)
+    handler.addFilter(SamplingFilter(parse_sample_rates(LOG_SAMPLE_RATES)))
+
+    level = LOG_LEVEL if LOG_LEVEL in LOG_LEVELS else "INFO"
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(max(logging.getLevelName(level), logging.INFO))
+    for name in SERVICE_LOGGERS:
+        logging.getLogger(name).setLevel(level)
+    _listener = logging.handlers.QueueListener(log_queue, output)
+    _listener.start()
+    if level != LOG_LEVEL:
+        logging.getLogger(__name__).warning("Unknown LOG_LEVEL %r, %s used instead", LOG_LEVEL, level)
+
+
+def stop_logging() -> None:
+    """Write the records still queued and stop the background thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
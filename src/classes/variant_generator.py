@@ -0,0 +1,105 @@
+import asyncio
+import concurrent.futures
+import logging
+import multiprocessing
+
+import gridfs
+from bson import ObjectId
+
+from classes.async_database_interface import AsyncDBInterface
+from classes.structured_logging import event
+from utils.image_variants import IMAGE_VARIANTS, resize_image
+
+logger = logging.getLogger(__name__)
+
+
+class UndecodableImageError(OSError):
+    """Raised for the variant of an image already found not to be one Pillow can decode"""
+
+
+class VariantGenerator:
+    """Resize images into the IMAGE_VARIANTS previews and store them in GridFS.
+
+    Decoding and encoding run in a pool of `workers` processes, so that they neither hold the GIL
+    of the event loop nor take a DB thread. The pool is started on first use, from a forkserver:
+    forking the service itself would copy its logging, DB pool and pymongo monitor threads mid-flight.
+    Every generation of a variant, after an upload or on request, goes through `_pending`, so
+    concurrent ones share a single resize; across instances the unique variant_of index keeps one copy.
+    An image Pillow fails to decode is marked in GridFS, and never read nor sent to the pool again.
+    """
+
+    def __init__(self, mongodb_interface: AsyncDBInterface, workers: int = None):
+        self.mongodb_interface = mongodb_interface
+        self.workers = workers
+        self._pool = None
+        self._pending: dict[tuple[ObjectId, str], asyncio.Future] = {}
+        self.stats = {
+            "generated": 0,
+            "generated_on_request": 0,
+            "errors": 0
+        }
+
+    @property
+    def pool(self) -> concurrent.futures.ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = concurrent.futures.ProcessPoolExecutor(
+                self.workers, mp_context=multiprocessing.get_context("forkserver"))
+        return self._pool
+
+    async def _resize(self, data: bytes, size: str) -> bytes:
+        return await asyncio.get_running_loop().run_in_executor(self.pool, resize_image, data, IMAGE_VARIANTS[size])
+
+    async def generate_all(self, file_id: ObjectId) -> None:
+        """Produce every variant of a new image, run after its upload has been answered"""
+        try:
+            data = await self.mongodb_interface.read_image(file_id)
+            for size in IMAGE_VARIANTS:
+                if await self.mongodb_interface.get_image_variant(file_id, size) is None:
+                    await self._shared(file_id, size, data, "generated")
+        except Exception as e:
+            # Whatever is missing is generated on its first request; errors are counted by _generate
+            logger.warning("Variants of image %s not generated: %s", file_id, e,
+                           extra=event("image.variant", file_id=str(file_id)))
+
+    async def get(self, file_id: ObjectId, size: str) -> gridfs.GridOut:
+        """Variant `size` of an image, generated now if missing. Raise gridfs.errors.NoFile for an unknown
+        image, the error of Pillow for a file it cannot decode, then UndecodableImageError for it."""
+        variant = await self.mongodb_interface.get_image_variant(file_id, size)
+        if variant is None:
+            await self._shared(file_id, size, None, "generated_on_request")
+            variant = await self.mongodb_interface.get_image_variant(file_id, size)
+        if variant is not None and variant._id == file_id:
+            raise UndecodableImageError(f"Image {file_id} cannot be decoded")
+        return variant
+
+    async def _shared(self, file_id: ObjectId, size: str, data: bytes or None, counter: str) -> None:
+        """Generate a variant, or wait for the generation of it already in progress"""
+        key = (file_id, size)
+        if key not in self._pending:
+            self._pending[key] = asyncio.ensure_future(self._generate(file_id, size, data, counter))
+            self._pending[key].add_done_callback(lambda _: self._pending.pop(key, None))
+        await asyncio.shield(self._pending[key])  # a cancelled request does not cancel the others
+
+    async def _generate(self, file_id: ObjectId, size: str, data: bytes or None, counter: str) -> None:
+        if data is None:
+            data = await self.mongodb_interface.read_image(file_id)  # NoFile for an unknown image, not an error
+        try:
+            resized = await self._resize(data, size)
+            stored = await self.mongodb_interface.store_image_variant(file_id, size, resized)
+        except OSError:  # raised by Pillow for a file it cannot decode
+            self.stats["errors"] += 1
+            await self.mongodb_interface.mark_undecodable(file_id)
+            raise
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        if stored is not None:
+            self.stats[counter] += 1
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    def metrics(self) -> dict:
+        return {"pending": len(self._pending), **self.stats}
@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import time
+
+from classes.async_database_interface import AsyncDBInterface
+from classes.database_interface import VoteFlushError
+
+logger = logging.getLogger(__name__)
+
+
+class VoteAggregator:
+    """Write-behind buffer for like counters.
+
+    Votes are summed in memory per target ((publication_id,), (publication_id, comment_id) or
+    (publication_id, comment_id, reply_id)) and written every `flush_interval` seconds as one
+    DBInterface.bulk_vote call, or as soon as `max_targets` distinct targets are pending.
+    After a failed flush only the deltas which were surely not written are buffered again; those
+    whose write is uncertain are counted in votes_lost rather than risking counting them twice.
+    """
+
+    def __init__(self, mongodb_interface: AsyncDBInterface, flush_interval: float, max_targets: int = 10000):
+        self.mongodb_interface = mongodb_interface
+        self.flush_interval = flush_interval
+        self.max_targets = max_targets
+        self.buffer: dict[tuple, int] = {}
+        self._full = asyncio.Event()
+        self._task = None
+        self._flush_lock = asyncio.Lock()
+        self.stats = {
+            "votes_buffered": 0,
+            "flushes": 0,
+            "flush_errors": 0,
+            "votes_lost": 0,
+            "last_flush_latency_seconds": 0.0,
+            "max_flush_latency_seconds": 0.0
+        }
+
+    def add(self, target: tuple, delta: int) -> None:
+        self.buffer[target] = self.buffer.get(target, 0) + delta
+        self.stats["votes_buffered"] += 1
+        if len(self.buffer) >= self.max_targets:
+            self._full.set()
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            if not self.buffer:
+                return
+            deltas, self.buffer = self.buffer, {}
+            start = time.perf_counter()
+            try:
+                await self.mongodb_interface.bulk_vote(deltas)
+            except VoteFlushError as e:
+                # Keep the votes known not to be written for the next flush, the others are already counted
+                for target, delta in e.retry.items():
+                    self.buffer[target] = self.buffer.get(target, 0) + delta
+                self.stats["flush_errors"] += 1
+                self.stats["votes_lost"] += sum(abs(delta) for delta in e.lost.values())
+                logger.error("Vote flush failed: %s", e)
+                return
+            except Exception as e:
+                # Raised before any write, e.g. by the thread pool: nothing was applied
+                for target, delta in deltas.items():
+                    self.buffer[target] = self.buffer.get(target, 0) + delta
+                self.stats["flush_errors"] += 1
+                logger.error("Vote flush failed, %d targets kept in buffer: %s", len(deltas), e)
+                return
+            latency = time.perf_counter() - start
+            self.stats["flushes"] += 1
+            self.stats["last_flush_latency_seconds"] = latency
+            self.stats["max_flush_latency_seconds"] = max(latency, self.stats["max_flush_latency_seconds"])
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            await self.flush()
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+
+    def metrics(self) -> dict:
+        return {
+            "buffer_depth": len(self.buffer),
+            "pending_delta": sum(abs(delta) for delta in self.buffer.values()),
+            **self.stats
+        }
@@ -1,17 +1,33 @@
-from fastapi import FastAPI, Response, status, UploadFile
+from fastapi import BackgroundTasks, FastAPI, Query, Request, Response, status, UploadFile
 from fastapi.responses import StreamingResponse
 from bson import ObjectId
+import asyncio
+from email.utils import format_datetime
 import datetime
-import json
-import requests
+import gridfs
+import httpx
+import logging
+import orjson
 import os
-from io import BytesIO
-
-from classes.database_interface import DBInterface
+import pydantic
+
+from classes.async_database_interface import AsyncDBInterface
+from classes.database_interface import HASHTAG_COUNT_RETENTION_HOURS, FileTooLargeError
+from classes import index_manager
+from classes.vote_aggregator import VoteAggregator
+from classes.deletion_worker import DeletionWorker
+from classes.mint_worker import MintWorker
+from classes.variant_generator import UndecodableImageError, VariantGenerator
+from classes.service_client import ServiceClient
+from classes.stale_while_revalidate import StaleWhileRevalidate
+from classes import metrics, structured_logging
 import utils
 
-app = FastAPI()
-mongodb_interface = DBInterface()
+structured_logging.configure_logging()  # before anything logs
+logger = logging.getLogger(__name__)
+
+app = FastAPI(default_response_class=utils.MongoJSONResponse)
+mongodb_interface = AsyncDBInterface()
 
 TRENDTRACKER_URL = os.environ["TRENDTRACKER_URL"]
 TRENDTRACKER_PORT = os.environ["TRENDTRACKER_PORT"]
@@ -20,6 +36,138 @@ TRENDTRACKER_BL_ENDPOINT = "/get_new_best_publications_ids"
 NFT_URL = os.environ["NFT_URL"]
 NFT_PORT = os.environ["NFT_PORT"]
 
+TRENDTRACKER_TIMEOUT = float(os.environ.get("TRENDTRACKER_TIMEOUT", 2))  # seconds
+NFT_TIMEOUT = float(os.environ.get("NFT_TIMEOUT", 30))  # seconds, minting waits for the chain
+trendtracker_client: ServiceClient = None
+BEST_PUBLICATIONS_TTL = float(os.environ.get("BEST_PUBLICATIONS_TTL", 60))  # seconds
+nft_client: ServiceClient = None
+NFT_IMAGES_URL = "http://169.51.204.107/api/images"  # where the NFT service fetches the image to mint
+
+IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Processes resizing the uploaded images into their previews, default one per CPU
+IMAGE_WORKERS = int(os.environ["IMAGE_WORKERS"]) if "IMAGE_WORKERS" in os.environ else None
+variant_generator = VariantGenerator(mongodb_interface, IMAGE_WORKERS)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+BULK_BATCH_SIZE = 1000  # publications per insert_many
+MAX_REPORTED_ERRORS = 1000
+
+APPLY_INDEXES_ON_STARTUP = os.environ.get("APPLY_INDEXES_ON_STARTUP", "1") == "1"
+
+MAX_UPLOAD_SIZE = int(os.environ.get("MAX_UPLOAD_SIZE", 20 * 1024 * 1024))  # bytes
+# Seconds between two flushes of the buffered votes, 0 writes every vote immediately
+VOTE_FLUSH_INTERVAL = float(os.environ.get("VOTE_FLUSH_INTERVAL", 0))
+vote_aggregator = VoteAggregator(mongodb_interface, VOTE_FLUSH_INTERVAL) if VOTE_FLUSH_INTERVAL > 0 else None
+
+# Purge of the publications marked as deleted: batch size and pause after each batch (seconds)
+DELETION_BATCH_SIZE = int(os.environ.get("DELETION_BATCH_SIZE", 100))
+DELETION_BATCH_INTERVAL = float(os.environ.get("DELETION_BATCH_INTERVAL", 0.5))
+DELETION_POLL_INTERVAL = float(os.environ.get("DELETION_POLL_INTERVAL", 5))  # seconds between checks for new jobs
+deletion_worker = DeletionWorker(mongodb_interface, DELETION_BATCH_SIZE, DELETION_BATCH_INTERVAL,
+                                 DELETION_POLL_INTERVAL)
+
+# Minting queue: concurrent mints, attempts before dead-lettering, retry backoff (seconds)
+MINT_CONCURRENCY = int(os.environ.get("MINT_CONCURRENCY", 4))
+MINT_MAX_ATTEMPTS = int(os.environ.get("MINT_MAX_ATTEMPTS", 5))
+MINT_BACKOFF = float(os.environ.get("MINT_BACKOFF", 5))
+MINT_MAX_BACKOFF = float(os.environ.get("MINT_MAX_BACKOFF", 300))
+MINT_POLL_INTERVAL = float(os.environ.get("MINT_POLL_INTERVAL", 5))  # seconds between checks for due jobs
+
+
+async def mint_nft(file_id: str, wallet: str) -> httpx.Response:
+    return await nft_client.post("/mint", json={
+        "name": "OsirisNFT",
+        "description": "NiceNFT",
+        "file_url": f"{NFT_IMAGES_URL}/{file_id}",
+        "address": wallet
+    })
+
+
+# The lease outlasts a mint call with the connection retries of the client
+mint_worker = MintWorker(mongodb_interface, mint_nft, MINT_CONCURRENCY, MINT_MAX_ATTEMPTS, MINT_BACKOFF,
+                         MINT_MAX_BACKOFF, MINT_POLL_INTERVAL, lease=4 * NFT_TIMEOUT)
+
+app.add_middleware(utils.UploadSizeLimitMiddleware, max_size=MAX_UPLOAD_SIZE, path_prefixes=("/upload",))
+app.add_middleware(metrics.RequestMetricsMiddleware)  # outermost: also times the rejected uploads
+
+if vote_aggregator is not None:
+    metrics.register_stats("vote_aggregator", vote_aggregator.metrics)
+metrics.register_stats("deletion_worker", deletion_worker.metrics)
+metrics.register_stats("mint_worker", mint_worker.metrics)
+metrics.register_stats("image_variants", variant_generator.metrics)
+if mongodb_interface.cache is not None:
+    metrics.register_stats("publication_cache", mongodb_interface.cache.metrics)
+if mongodb_interface.image_cache is not None:
+    metrics.register_stats("image_cache", mongodb_interface.image_cache.metrics)
+
+
+@app.on_event("startup")
+async def startup():
+    global trendtracker_client, nft_client
+    trendtracker_client = ServiceClient(TRENDTRACKER_URL + ':' + TRENDTRACKER_PORT, timeout=TRENDTRACKER_TIMEOUT,
+                                        name="trendtracker")
+    nft_client = ServiceClient(NFT_URL + ':' + NFT_PORT, timeout=NFT_TIMEOUT, name="nft")
+    if APPLY_INDEXES_ON_STARTUP:
+        await mongodb_interface.run(index_manager.apply_indexes, mongodb_interface.sync)
+    if vote_aggregator is not None:
+        vote_aggregator.start()
+    deletion_worker.start()
+    mint_worker.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await deletion_worker.stop()
+    await mint_worker.stop()
+    variant_generator.close()
+    if vote_aggregator is not None:
+        await vote_aggregator.stop()
+    await trendtracker_client.aclose()
+    await nft_client.aclose()
+    mongodb_interface.close()
+    structured_logging.stop_logging()
+
+
+async def vote(db_method, delta: int, *target_ids: str) -> bool:
+    """Apply a vote directly, or buffer it when write-behind aggregation is enabled.
+
+    Buffered votes are reported as successful once their publication is known to be visible:
+    the existence of the comment or reply itself is not checked.
+    """
+    if vote_aggregator is None:
+        return await db_method(*target_ids)
+    if not await mongodb_interface.is_visible(target_ids[0]):
+        return False
+    vote_aggregator.add(target_ids, delta)
+    return True
+
+
+def read_page(request: Request, cursor: str or None, limit: int or None) -> tuple[tuple or None, int or None, bool]:
+    """Decode the keyset cursor (ValueError if malformed) and choose the page size.
+
+    JSON pages default to DEFAULT_PAGE_SIZE publications, NDJSON streams are unbounded unless a limit is given.
+    """
+    after = utils.decode_cursor(cursor) if cursor else None
+    stream = utils.accepts_ndjson(request.headers.get("accept"))
+    if limit is None and not stream:
+        limit = DEFAULT_PAGE_SIZE
+    return after, limit, stream
+
+
+page_responses = {
+    400: {"description": "Invalid cursor."},
+    200: {
+        "description": "One page of publications, newest first. Pass `next_cursor` as `cursor` to get the next one.",
+        "content": {
+            utils.NDJSON_MEDIA_TYPE: {
+                "example": '{"_id": "5bf142459b72e12b2b1b2cd", ...}\n{"next_cursor": "MjAyMi0wNS0xMF..."}\n'
+            }
+        }
+    }
+}
+
 
 @app.get("/")
 async def root():
@@ -41,7 +189,7 @@ async def root():
           })
 async def post_publication(posted_publication: utils.PublicationModel):
     publication = utils.build_publication(dict(posted_publication))
-    publication_id = mongodb_interface.insert_one_publication(publication)
+    publication_id = await mongodb_interface.insert_one_publication(publication)
     publication["_id"] = publication_id
     return {
         "message": "Publication posted !",
@@ -50,10 +198,91 @@ async def post_publication(posted_publication: utils.PublicationModel):
     }
 
 
+async def bulk_items(request: Request):
+    """Yield (index, item) of a JSON array or NDJSON body; an NDJSON line that is not JSON yields a ValueError"""
+    if request.headers.get("content-type", "").split(";")[0].strip() == utils.NDJSON_MEDIA_TYPE:
+        index = 0
+        async for line in utils.ndjson_lines(request.stream()):
+            try:
+                yield index, orjson.loads(line)
+            except orjson.JSONDecodeError as e:
+                yield index, ValueError(f"Invalid JSON: {e}")
+            index += 1
+    else:
+        items = orjson.loads(await request.body())
+        if not isinstance(items, list):
+            raise ValueError("The body must be a JSON array of publications")
+        for index, item in enumerate(items):
+            yield index, item
+
+
+@app.post("/bulk_publications",
+          responses={
+              400: {"description": "The body is neither a JSON array nor NDJSON."},
+              200: {
+                  "description": "Publications inserted; the ones that failed validation or insertion are listed "
+                                 "by their position in the body (the first MAX_REPORTED_ERRORS).",
+                  "content": {
+                      "application/json": {
+                          "example": {"received": 3, "inserted": 2, "errors_count": 1,
+                                      "errors": [{"index": 1, "error": "user_name: field required"}]}
+                      }
+                  }
+              }
+          })
+async def bulk_post_publications(request: Request, response: Response):
+    """Insert many publications (same fields as /post_publication) from a JSON array, or from an
+    application/x-ndjson stream with one publication per line, which is never read into memory whole."""
+    report = {"received": 0, "inserted": 0, "errors_count": 0, "errors": []}
+
+    def add_error(index: int, error: str) -> None:
+        report["errors_count"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"index": index, "error": error})
+
+    async def insert(batch: list[dict], indexes: list[int]) -> None:
+        errors = await mongodb_interface.insert_many_publications(batch)
+        report["inserted"] += len(batch) - len(errors)
+        for position, error in errors.items():
+            add_error(indexes[position], error)
+
+    batch, indexes = [], []
+    insertion = None  # the previous batch is written while the next one is parsed
+    try:
+        async for index, item in bulk_items(request):
+            report["received"] += 1
+            if isinstance(item, ValueError):
+                add_error(index, str(item))
+                continue
+            try:
+                posted_publication = utils.PublicationModel.parse_obj(item)
+            except pydantic.ValidationError as e:
+                add_error(index, "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()))
+                continue
+            batch.append(utils.build_publication(dict(posted_publication)))
+            indexes.append(index)
+            if len(batch) == BULK_BATCH_SIZE:
+                if insertion is not None:
+                    await insertion
+                insertion = asyncio.create_task(insert(batch, indexes))
+                batch, indexes = [], []
+    except ValueError as e:  # also orjson.JSONDecodeError
+        if insertion is not None:
+            await insertion
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return {"message": str(e), **report}
+    if insertion is not None:
+        await insertion
+    if batch:
+        await insert(batch, indexes)
+    return report
+
+
 @app.post("/post_comment/{publication_id}",
           status_code=status.HTTP_201_CREATED,
           responses={
               400: {"description": "Wrong format."},
+              404: {"description": "The publication does not exist."},
               201: {
                   "description": "Comment posted.",
                   "content": {
@@ -74,8 +303,15 @@ async def post_a_comment(publication_id: str, posted_comment: utils.CommentModel
         }
     # Build comment
     comment = utils.build_comment(dict(posted_comment))
-    comment_id = mongodb_interface.insert_one_comment(publication_id, comment)
+    comment_id = await mongodb_interface.insert_one_comment(publication_id, comment)
+    if comment_id is None:
+        response.status_code = status.HTTP_404_NOT_FOUND
+        return {
+            "message": "Publication does not exist"
+        }
     comment["_id"] = str(comment_id)
+    comment["publication_id"] = publication_id
+    comment["parent_id"] = None
     return {
         "message": "Comment successfully posted !",
         "comment": comment
@@ -86,6 +322,7 @@ async def post_a_comment(publication_id: str, posted_comment: utils.CommentModel
           status_code=status.HTTP_201_CREATED,
           responses={
               400: {"description": "Wrong format."},
+              404: {"description": "The publication or comment does not exist."},
               201: {
                   "description": "Reply posted.",
                   "content": {
@@ -99,14 +336,21 @@ async def post_a_comment(publication_id: str, posted_comment: utils.CommentModel
               }
           })
 async def post_a_reply(publication_id: str, comment_id: str, posted_reply: utils.ReplyModel, response: Response):
-    if not ObjectId.is_valid(publication_id):
+    if not (ObjectId.is_valid(publication_id) and ObjectId.is_valid(comment_id)):
         response.status_code = status.HTTP_400_BAD_REQUEST
         return {
             "message": "Invalid ID"
         }
     # Build reply
     reply = utils.build_reply(dict(posted_reply))
-    reply_id = mongodb_interface.insert_one_reply(publication_id, comment_id, reply)
+    reply_id = await mongodb_interface.insert_one_reply(publication_id, comment_id, reply)
+    if reply_id is None:
+        response.status_code = status.HTTP_404_NOT_FOUND
+        return {
+            "message": "Publication or comment does not exist"
+        }
+    reply["publication_id"] = publication_id
+    reply["parent_id"] = comment_id
     reply["_id"] = reply_id
     return {
         "message": "Comment successfully posted !",
@@ -114,32 +358,196 @@ async def post_a_reply(publication_id: str, comment_id: str, posted_reply: utils
     }
 
 
+@app.get("/get_comments/{publication_id}",
+         responses={
+             400: {"description": "Invalid ID or cursor."},
+             404: {"description": "The publication does not exist or is deleted."},
+             200: {
+                 "description": "One page of the publication's comments, oldest first. "
+                                "Pass `next_cursor` as `cursor` to get the next one.",
+                 "content": {
+                     "application/json": {
+                         "example": {"comments": [utils.comment_example], "next_cursor": None}
+                     }
+                 }
+             }
+         })
+async def get_comments(publication_id: str, request: Request, response: Response, cursor: str = None,
+                       limit: int = Query(None, ge=1, le=MAX_PAGE_SIZE)):
+    if not ObjectId.is_valid(publication_id):
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return {
+            "message": "Invalid ID"
+        }
+    try:
+        after, limit, stream = read_page(request, cursor, limit)
+    except ValueError:
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return {
+            "message": "Invalid cursor"
+        }
+    comments = await mongodb_interface.get_comments(publication_id, after=after, limit=limit)
+    if comments is None:
+        response.status_code = status.HTTP_404_NOT_FOUND
+        return {
+            "message": "Publication does not exist"
+        }
+    if stream:
+        return StreamingResponse(utils.stream_ndjson(comments, limit), media_type=utils.NDJSON_MEDIA_TYPE)
+    comments = await mongodb_interface.to_list(comments)
+    return utils.MongoJSONResponse({
+        "comments": comments,
+        "next_cursor": utils.next_cursor(comments, limit)
+    })
+
+
+@app.get("/get_replies/{publication_id}/{comment_id}",
+         responses={
+             400: {"description": "Invalid ID or cursor."},
+             404: {"description": "The publication does not exist or is deleted."},
+             200: {
+                 "description": "One page of the comment's replies, oldest first. "
+                                "Pass `next_cursor` as `cursor` to get the next one.",
+                 "content": {
+                     "application/json": {
+                         "example": {"replies": [utils.reply_example], "next_cursor": None}
+                     }
+                 }
+             }
+         })
+async def get_replies(publication_id: str, comment_id: str, request: Request, response: Response,
+                      cursor: str = None, limit: int = Query(None, ge=1, le=MAX_PAGE_SIZE)):
+    if not (ObjectId.is_valid(publication_id) and ObjectId.is_valid(comment_id)):
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return {
+            "message": "Invalid ID"
+        }
+    try:
+        after, limit, stream = read_page(request, cursor, limit)
+    except ValueError:
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return {
+            "message": "Invalid cursor"
+        }
+    replies = await mongodb_interface.get_replies(publication_id, comment_id, after=after, limit=limit)
+    if replies is None:
+        response.status_code = status.HTTP_404_NOT_FOUND
+        return {
+            "message": "Publication does not exist"
+        }
+    if stream:
+        return StreamingResponse(utils.stream_ndjson(replies, limit), media_type=utils.NDJSON_MEDIA_TYPE)
+    replies = await mongodb_interface.to_list(replies)
+    return utils.MongoJSONResponse({
+        "replies": replies,
+        "next_cursor": utils.next_cursor(replies, limit)
+    })
+
+
 @app.get("/insert_samples")  # DEBUG
 async def debug():
     for publication in utils.samples:
-        mongodb_interface.insert_one_publication(publication)
+        await mongodb_interface.insert_one_publication(publication)
     return {"message": "samples posted"}
 
 
-@app.get("/images/{file_id}")  # TODO doc
-async def get_image(file_id: str):
-    img_bytes = mongodb_interface.download_image(ObjectId(file_id)).read()
-    img = BytesIO(img_bytes)
-    return StreamingResponse(img, media_type="image/jpeg")
-
+@app.get("/images/{file_id}",
+         responses={
+             400: {"description": "The ID provided is not a valid ObjectId, or the size is unknown."},
+             404: {"description": "The image does not exist."},
+             206: {"description": "Requested byte range of the image."},
+             304: {"description": "The cached image is still valid."},
+             416: {"description": "The requested range cannot be satisfied."},
+             200: {"description": "Image streamed.", "content": {"image/jpeg": {}}}
+         })
+async def get_image(file_id: str, request: Request, size: str = Query(
+        None, description=f"Preview instead of the original, one of: {', '.join(utils.IMAGE_VARIANTS)}")):
+    if not ObjectId.is_valid(file_id) or (size is not None and size not in utils.IMAGE_VARIANTS):
+        return Response(status_code=status.HTTP_400_BAD_REQUEST)
+    image_cache = mongodb_interface.image_cache
+    image = image_cache.get(ObjectId(file_id), size) if image_cache is not None else None
+    cache_hit = image is not None
+    if image is None:
+        try:
+            grid_out = None
+            if size is not None:
+                try:
+                    grid_out = await variant_generator.get(ObjectId(file_id), size)
+                except OSError as e:  # not an image Pillow can decode, its original is served as is
+                    if not isinstance(e, UndecodableImageError):  # logged once, when found out
+                        logger.warning("No %s variant for image %s: %s", size, file_id, e,
+                                       extra=structured_logging.event("image.variant", file_id=file_id,
+                                                                      variant=size))
+                    size = None
+                    image = image_cache.get(ObjectId(file_id)) if image_cache is not None else None
+                    cache_hit = image is not None
+            if grid_out is None and image is None:
+                grid_out = await mongodb_interface.download_image(ObjectId(file_id))
+        except gridfs.errors.NoFile:
+            return Response(status_code=status.HTTP_404_NOT_FOUND)
+        if image is None and image_cache is not None and image_cache.admits(grid_out.length):
+            image = await mongodb_interface.cache_image(grid_out, ObjectId(file_id), size)
+    upload_date, length = (image.upload_date, len(image.data)) if image is not None \
+        else (grid_out.upload_date, grid_out.length)
+    content_type = (image.content_type if image is not None else grid_out.content_type) or "image/jpeg"
+
+    etag = f'"{file_id}-{size}"' if size is not None else f'"{file_id}"'  # a file id never changes content
+    headers = {
+        "ETag": etag,
+        "Last-Modified": format_datetime(upload_date.replace(tzinfo=datetime.timezone.utc), usegmt=True),
+        "Cache-Control": IMAGE_CACHE_CONTROL,
+        "Accept-Ranges": "bytes"
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in if_none_match.split(",")):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
 
-@app.post("/upload/{publication_id}")
-async def upload_image(publication_id: str, file: UploadFile):
+    try:
+        byte_range = utils.parse_range(request.headers.get("range"), length)
+    except ValueError:
+        headers["Content-Range"] = f"bytes */{length}"
+        return Response(status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE, headers=headers)
+    if byte_range is None:
+        start, end, status_code = 0, length - 1, status.HTTP_200_OK
+    else:
+        (start, end), status_code = byte_range, status.HTTP_206_PARTIAL_CONTENT
+        headers["Content-Range"] = f"bytes {start}-{end}/{length}"
+    headers["Content-Length"] = str(end - start + 1)
+    if image is not None:
+        if cache_hit:
+            image_cache.count_served(end - start + 1)
+        return utils.MemoryViewResponse(image.view(start, end), status_code=status_code, media_type=content_type,
+                                        headers=headers)
+    chunks = metrics.count_bytes(utils.gridfs_chunks(grid_out, start, end), metrics.GRIDFS_BYTES_OUT)
+    return StreamingResponse(chunks,
+                             status_code=status_code,
+                             media_type=content_type,
+                             headers=headers)
+
+
+@app.post("/upload/{publication_id}",
+          responses={
+              400: {"description": "Only jpeg files are supported."},
+              413: {"description": "File too large."}
+          })
+async def upload_image(publication_id: str, file: UploadFile, response: Response,
+                       background_tasks: BackgroundTasks):
     allowed_files = {"image/jpeg"}  # "image/png", "image/gif", "image/tiff", "image/bmp", "video/webm"
     if file.content_type in allowed_files:
-        file_id = str(mongodb_interface.upload_image(file.file.read()))
-        mongodb_interface.set_url(publication_id, file_id)
+        try:
+            file_id = str(await mongodb_interface.upload_image(file.file, max_size=MAX_UPLOAD_SIZE))
+        except FileTooLargeError:
+            response.status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            return {"message": f"File exceeds {MAX_UPLOAD_SIZE} bytes."}
+        await mongodb_interface.set_url(publication_id, file_id)
+        background_tasks.add_task(variant_generator.generate_all, ObjectId(file_id))
         return {
             "filename": file.filename,
             "file_id": file_id
         }
     else:
-        return "Only jpeg file are supported."
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return {"message": "Only jpeg file are supported."}
 
 
 @app.get("/get_publication_by_id/{publication_id}",
@@ -164,12 +572,11 @@ async def get_publication(publication_id: str, response: Response):
             "message": "Invalid ID"
         }
 
-    publication = mongodb_interface.get_one_publication(publication_id)
+    publication = await mongodb_interface.get_one_publication(publication_id)
     if publication is not None:
-        formatted_publication = utils.stringify_ids(publication)
-        return {
-            "publication": formatted_publication
-        }
+        return utils.MongoJSONResponse({
+            "publication": publication
+        })
     else:
         response.status_code = status.HTTP_404_NOT_FOUND
         return {
@@ -181,12 +588,19 @@ async def get_publication(publication_id: str, response: Response):
          status_code=status.HTTP_200_OK,
          responses={
              404: {"description": "The user does not exit."},
+             400: page_responses[400],
              200: {
-                 "description": "Publications of the user returned.",
+                 "description": "Publications of the user returned, newest first. "
+                                "Pass `next_cursor` as `cursor` to get the next page.",
                  "content": {
                      "application/json": {
-                         "example": [utils.publication_example, utils.publication_example]
-                     }
+                         "example": {
+                             "message": "publications returned",
+                             "publications": [utils.publication_example, utils.publication_example],
+                             "next_cursor": None
+                         }
+                     },
+                     **page_responses[200]["content"]
                  }
              },
              204: {
@@ -198,16 +612,25 @@ async def get_publication(publication_id: str, response: Response):
                  }
              }
          })
-async def get_user_publications(user_name: str, response: Response):
-    publications = mongodb_interface.get_user_publications(user_name)
-    if publications:
-        formatted_publications = []
-        for publication in publications:
-            formatted_publications.append(utils.stringify_ids(publication))
+async def get_user_publications(user_name: str, request: Request, response: Response, cursor: str = None,
+                                limit: int = Query(None, ge=1, le=MAX_PAGE_SIZE)):
+    try:
+        after, limit, stream = read_page(request, cursor, limit)
+    except ValueError:
+        response.status_code = status.HTTP_400_BAD_REQUEST
         return {
-            "message": "publications returned",
-            "publications": formatted_publications
+            "message": "Invalid cursor"
         }
+    publications = await mongodb_interface.get_user_publications(user_name, after=after, limit=limit)
+    if stream:
+        return StreamingResponse(utils.stream_ndjson(publications, limit), media_type=utils.NDJSON_MEDIA_TYPE)
+    publications = await mongodb_interface.to_list(publications)
+    if publications or after is not None:
+        return utils.MongoJSONResponse({
+            "message": "publications returned",
+            "publications": publications,
+            "next_cursor": utils.next_cursor(publications, limit)
+        })
     else:
         response.status_code = status.HTTP_204_NO_CONTENT
         return {
@@ -215,17 +638,24 @@ async def get_user_publications(user_name: str, response: Response):
         }
 
 
+deletion_job_example = {
+    "message": "publication 5bf142459b72e12b2b1b2cd marked as deleted",
+    "job_id": "6368f1ba2c1e4b8f9c7d0a31"
+}
+
+
 @app.delete("/delete_publication_by_id/{publication_id}",
-            status_code=status.HTTP_204_NO_CONTENT,
+            status_code=status.HTTP_202_ACCEPTED,
             responses={
                 400: {
                     "description": "The ID provided is not a valid ObjectId, it must be 12-byte input or a 24-character hex string."},
-                204: {
-                    "description": "The publication got removed.",
+                404: {"description": "No publication to delete, or already deleted."},
+                202: {
+                    "description": "The publication is hidden at once. Its comments, likes and image are removed "
+                                   "in the background, follow it with GET /deletion_jobs/{job_id}.",
                     "content": {
                         "application/json": {
-                            "example":
-                                utils.publication_example
+                            "example": deletion_job_example
                         }
                     }
                 }
@@ -237,12 +667,11 @@ async def delete_publication(publication_id: str, response: Response):
             "message": "Invalid ID"
         }
 
-    removed_publication = mongodb_interface.delete_one_publication(publication_id)
-    if removed_publication is not None:
-        formatted_publication = utils.stringify_ids(removed_publication)
+    job = await mongodb_interface.delete_one_publication(publication_id)
+    if job is not None:
         return {
-            "message": f"publication {publication_id} deleted",
-            "removed publication": formatted_publication
+            "message": f"publication {publication_id} marked as deleted",
+            "job_id": str(job["_id"])
         }
     else:
         response.status_code = status.HTTP_404_NOT_FOUND
@@ -252,25 +681,63 @@ async def delete_publication(publication_id: str, response: Response):
 
 
 @app.delete("/delete_publications_of_user/{user_name}",
-            status_code=status.HTTP_204_NO_CONTENT,
+            status_code=status.HTTP_202_ACCEPTED,
             responses={
                 404: {"description": "The user does not exit."},
-                204: {
-                    "description": "User's publication got removed.",
+                202: {
+                    "description": "User's publications are hidden at once and removed in the background, "
+                                   "follow it with GET /deletion_jobs/{job_id}.",
                     "content": {
                         "application/json": {
-                            "example": {"message": "17 publication(s) of foo removed."}
+                            "example": {"message": "17 publication(s) of foo marked as deleted",
+                                        "job_id": deletion_job_example["job_id"]}
                         }
                     }
                 }
             })
-async def delete_publications_of_user(user_name: str):
-    result = mongodb_interface.delete_user_publications(user_name)
+async def delete_publications_of_user(user_name: str, response: Response):
+    job = await mongodb_interface.delete_user_publications(user_name)
+    if job is None:
+        response.status_code = status.HTTP_404_NOT_FOUND
+        return {
+            "message": f"{user_name} has no publications"
+        }
     return {
-        "message": f"{result.deleted_count} publication(s) of {user_name} removed."
+        "message": f"{job['total']} publication(s) of {user_name} marked as deleted",
+        "job_id": str(job["_id"])
     }
 
 
+@app.get("/deletion_jobs/{job_id}",
+         responses={
+             400: {"description": "Invalid ID."},
+             404: {"description": "Unknown job, or finished for more than a week."},
+             200: {
+                 "description": "Progress of a deletion: `purged` of `total` publications removed. "
+                                "The status goes from pending to running to done.",
+                 "content": {
+                     "application/json": {
+                         "example": {"job": {
+                             "_id": deletion_job_example["job_id"], "kind": "user", "target": {"user_name": "foo"},
+                             "status": "running", "total": 17, "purged": 10,
+                             "created_at": "2022-11-07T12:00:00", "updated_at": "2022-11-07T12:00:02",
+                             "finished_at": None
+                         }}
+                     }
+                 }
+             }
+         })
+async def get_deletion_job(job_id: str, response: Response):
+    if not ObjectId.is_valid(job_id):
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return {"message": "Invalid ID"}
+    job = await mongodb_interface.get_deletion_job(job_id)
+    if job is None:
+        response.status_code = status.HTTP_404_NOT_FOUND
+        return {"message": "No such deletion job"}
+    return utils.MongoJSONResponse({"job": job})
+
+
 @app.delete("/delete_comment_by_id/{publication_id}/{comment_id}",
             status_code=status.HTTP_204_NO_CONTENT,
             responses={
@@ -294,7 +761,7 @@ async def delete_comment(publication_id: str, comment_id: str, response: Respons
         return {
             "message": "One or many ID provided are not valid ObjectId, they must be 12-byte input or a 24-character hex string."
         }
-    is_success = mongodb_interface.delete_one_comment(comment_id, publication_id)
+    is_success = await mongodb_interface.delete_one_comment(comment_id, publication_id)
     if is_success:
         return {
             "message": "Comment successfully removed."
@@ -329,7 +796,7 @@ async def delete_reply(publication_id: str, comment_id: str, reply_id: str, resp
         return {
             "message": "One or many ID provided are not valid ObjectId, they must be 12-byte input or a 24-character hex string."
         }
-    is_success = mongodb_interface.delete_one_reply(reply_id, comment_id, publication_id)
+    is_success = await mongodb_interface.delete_one_reply(reply_id, comment_id, publication_id)
     if is_success:
         return {
             "message": "Reply successfully removed."
@@ -347,6 +814,7 @@ async def delete_reply(publication_id: str, comment_id: str, reply_id: str, resp
                400: {
                    "description": "One or many ID provided are not valid ObjectId, they must be 12-byte input or a 24-character hex string."},
                404: {"description": "The publication does not exit."},
+               203: {"description": "The publication was already liked by the user, nothing changed."},
                200: {
                    "description": "Publication got upvoted successfully.",
                    "content": {
@@ -363,22 +831,23 @@ async def upvote_a_publication(publication_id: str, user: str, response: Respons
             "message": "One or many ID provided are not valid ObjectId, they must be 12-byte input or a 24-character "
                        "hex string. "
         }
-    if mongodb_interface.is_liked(publication_id, user):
-        response.status_code = 203
-        return {
-            "message": "Publication already liked."
-        }
-    is_success = mongodb_interface.upvote_one_publication(publication_id)
-    if is_success:
-        mongodb_interface.store_like(publication_id, user)
-        return {
-            "message": "Publication upvoted !"
-        }
-    else:
+    is_changed = await mongodb_interface.like_publication(publication_id, user,
+                                                          update_count=vote_aggregator is None)
+    if is_changed is None:
         response.status_code = status.HTTP_404_NOT_FOUND
         return {
             "message": "Publication does not exist"
         }
+    elif not is_changed:
+        response.status_code = 203
+        return {
+            "message": "Publication already liked."
+        }
+    if vote_aggregator is not None:
+        vote_aggregator.add((publication_id,), 1)
+    return {
+        "message": "Publication upvoted !"
+    }
 
 
 @app.patch("/upvote_comment/{publication_id}/{comment_id}",
@@ -404,7 +873,7 @@ async def upvote_a_comment(publication_id: str, comment_id: str, response: Respo
         return {
             "message": "One or many ID provided are not valid ObjectId, they must be 12-byte input or a 24-character hex string."
         }
-    is_success = mongodb_interface.upvote_one_comment(publication_id, comment_id)
+    is_success = await vote(mongodb_interface.upvote_one_comment, 1, publication_id, comment_id)
     if is_success:
         return {
             "message": "Comment upvoted !"
@@ -437,7 +906,7 @@ async def upvote_a_reply(publication_id: str, comment_id: str, reply_id: str, re
         return {
             "message": "One or many ID provided are not valid ObjectId, they must be 12-byte input or a 24-character hex string."
         }
-    is_success = mongodb_interface.upvote_one_reply(publication_id, comment_id, reply_id)
+    is_success = await vote(mongodb_interface.upvote_one_reply, 1, publication_id, comment_id, reply_id)
     if is_success:
         return {
             "message": "Reply upvoted !"
@@ -455,6 +924,7 @@ async def upvote_a_reply(publication_id: str, comment_id: str, reply_id: str, re
                400: {
                    "description": "One or many ID provided are not valid ObjectId, they must be 12-byte input or a 24-character hex string."},
                404: {"description": "The publication does not exit."},
+               203: {"description": "The publication was not liked by the user, nothing changed."},
                200: {
                    "description": "Publication got downvoted successfully.",
                    "content": {
@@ -464,23 +934,29 @@ async def upvote_a_reply(publication_id: str, comment_id: str, reply_id: str, re
                    }
                }
            })
-def downvote_a_publication(publication_id: str, user: str, response: Response):
+async def downvote_a_publication(publication_id: str, user: str, response: Response):
     if not ObjectId.is_valid(publication_id):
         response.status_code = status.HTTP_400_BAD_REQUEST
         return {
             "message": "One or many ID provided are not valid ObjectId, they must be 12-byte input or a 24-character hex string."
         }
-    is_success = mongodb_interface.downvote_one_publication(publication_id)
-    if is_success:
-        mongodb_interface.del_like(publication_id, user)
-        return {
-            "message": "Publication downvoted !"
-        }
-    else:
+    is_changed = await mongodb_interface.unlike_publication(publication_id, user,
+                                                            update_count=vote_aggregator is None)
+    if is_changed is None:
         response.status_code = status.HTTP_404_NOT_FOUND
         return {
             "message": "Publication does not exist"
         }
+    elif not is_changed:
+        response.status_code = 203
+        return {
+            "message": "Publication not liked."
+        }
+    if vote_aggregator is not None:
+        vote_aggregator.add((publication_id,), -1)
+    return {
+        "message": "Publication downvoted !"
+    }
 
 
 @app.patch("/downvote_comment/{publication_id}/{comment_id}",
@@ -506,7 +982,7 @@ async def downvote_a_comment(publication_id: str, comment_id: str, response: Res
         return {
             "message": "One or many ID provided are not valid ObjectId, they must be 12-byte input or a 24-character hex string."
         }
-    is_success = mongodb_interface.downvote_one_comment(publication_id, comment_id)
+    is_success = await vote(mongodb_interface.downvote_one_comment, -1, publication_id, comment_id)
     if is_success:
         return {
             "message": "Comment downvoted !"
@@ -540,8 +1016,7 @@ async def downvote_a_reply(publication_id: str, comment_id: str, reply_id: str,
         return {
             "message": "One or many ID provided are not valid ObjectId, they must be 12-byte input or a 24-character hex string."
         }
-    is_success = mongodb_interface.downvote_one_reply(
-        publication_id, comment_id, reply_id)
+    is_success = await vote(mongodb_interface.downvote_one_reply, -1, publication_id, comment_id, reply_id)
     if is_success:
         return {
             "message": "Reply downvoted !"
@@ -556,62 +1031,96 @@ async def downvote_a_reply(publication_id: str, comment_id: str, reply_id: str,
 @app.get("/get_recent_publications",
          responses={
              400: {
-                 "description": "Time delta cannot be greater than 24 hours."},
+                 "description": "Time delta cannot be greater than 24 hours, or invalid cursor."},
              200: {
-                 "description": "Recent publications returned.",
+                 "description": "Recent publications returned, newest first. "
+                                "Pass `next_cursor` as `cursor` to get the next page.",
                  "content": {
                      "application/json": {
-                         "example": {"new": [utils.publication_example, utils.publication_example]}
-                     }
+                         "example": {
+                             "new": [utils.publication_example, utils.publication_example],
+                             "next_cursor": None
+                         }
+                     },
+                     **page_responses[200]["content"]
                  }
              }
          })
-async def get_recent_publications(hours_time_delta: int, response: Response):
+async def get_recent_publications(hours_time_delta: int, request: Request, response: Response, cursor: str = None,
+                                  limit: int = Query(None, ge=1, le=MAX_PAGE_SIZE)):
     if hours_time_delta > 24:
         response.status_code = status.HTTP_400_BAD_REQUEST
         return {
             "message": "Time delta cannot be greater than 24 hours"
         }
+    try:
+        after, limit, stream = read_page(request, cursor, limit)
+    except ValueError:
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return {
+            "message": "Invalid cursor"
+        }
     since_date = datetime.datetime.now() - datetime.timedelta(hours=hours_time_delta)
-    db_res = mongodb_interface.get_publications_since(since_date)
-    response.status_code = status.HTTP_200_OK
-    formatted_pubs = []
-    for pub in db_res:
-        formatted_pubs.append(utils.stringify_ids(pub))
-    return {
-        "new": formatted_pubs
-    }
+    db_res = await mongodb_interface.get_publications_since(since_date, after=after, limit=limit)
+    if stream:
+        return StreamingResponse(utils.stream_ndjson(db_res, limit), media_type=utils.NDJSON_MEDIA_TYPE)
+    db_res = await mongodb_interface.to_list(db_res)
+    return utils.MongoJSONResponse({
+        "new": db_res,
+        "next_cursor": utils.next_cursor(db_res, limit)
+    })
 
 
-@app.get("/trend_tracker_get_recent_publications",
+@app.get("/hashtags/top",
          responses={
              200: {
-                 "description": "Recent publications returned.",
+                 "description": "Most used hashtags of the publications of the last `hours` hours.",
                  "content": {
                      "application/json": {
-                         "example": {
-                             "87639a2738b16f89": 313,
-                             "876398273e916489": 3,
-                         }
+                         "example": {"hours": 24, "hashtags": [{"hashtag": "cat", "count": 42}]}
                      }
                  }
              }
-         }
-         )
-async def get_recent_publications_ids_and_likes(hours_time_delta: int, response: Response):
-    since_date = datetime.datetime.now() - datetime.timedelta(hours=hours_time_delta)
-    db_res = mongodb_interface.get_publications_since(since_date)
-    response.status_code = status.HTTP_200_OK
-    result = {}
-    for pub in db_res:
-        result[str(pub["_id"])] = pub["likes_count"]
-    return result
+         })
+async def get_top_hashtags(hours: int = Query(24, ge=1, le=HASHTAG_COUNT_RETENTION_HOURS),
+                           limit: int = Query(10, ge=1, le=100)):
+    since = datetime.datetime.now() - datetime.timedelta(hours=hours)
+    return {
+        "hours": hours,
+        "hashtags": await mongodb_interface.get_top_hashtags(since, limit)
+    }
+
+
+@app.get("/hashtags/{hashtag}/publications",
+         responses={**page_responses, 400: {"description": "Invalid hashtag or cursor."}})
+async def get_hashtag_publications(hashtag: str, request: Request, response: Response, cursor: str = None,
+                                   limit: int = Query(None, ge=1, le=MAX_PAGE_SIZE)):
+    hashtag = utils.normalize_hashtag(hashtag)
+    if not hashtag:
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return {
+            "message": "Invalid hashtag"
+        }
+    try:
+        after, limit, stream = read_page(request, cursor, limit)
+    except ValueError:
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return {
+            "message": "Invalid cursor"
+        }
+    publications = await mongodb_interface.get_hashtag_publications(hashtag, after=after, limit=limit)
+    if stream:
+        return StreamingResponse(utils.stream_ndjson(publications, limit), media_type=utils.NDJSON_MEDIA_TYPE)
+    publications = await mongodb_interface.to_list(publications)
+    return utils.MongoJSONResponse({
+        "hashtag": hashtag,
+        "publications": publications,
+        "next_cursor": utils.next_cursor(publications, limit)
+    })
 
 
-@app.get("/trend_tracker_get_many_publications",
+@app.get("/trend_tracker_get_recent_publications",
          responses={
-             400: {
-                 "description": "One or many ID provided are not valid ObjectId, they must be 12-byte input or a 24-character hex string."},
              200: {
                  "description": "Recent publications returned.",
                  "content": {
@@ -625,29 +1134,67 @@ async def get_recent_publications_ids_and_likes(hours_time_delta: int, response:
              }
          }
          )
-async def get_many_publications_ids_and_likes(id_list_str: str, response: Response):
-    id_list = id_list_str.split(',')
-    print(id_list)
-    response_list = {}
-    for _id in id_list:
-        if not (ObjectId.is_valid(_id)):
-            response.status_code = status.HTTP_400_BAD_REQUEST
-            return {
-                "message": "One or many ID provided are not valid ObjectId, they must be 12-byte input or a 24-character hex string."
+async def get_recent_publications_ids_and_likes(hours_time_delta: int):
+    since_date = datetime.datetime.now() - datetime.timedelta(hours=hours_time_delta)
+    cursor = await mongodb_interface.get_publications_since(since_date, projection={"likes_count": 1})
+    return StreamingResponse(utils.stream_likes(cursor), media_type="application/json")
+
+
+trend_tracker_many_publications_responses = {
+    400: {
+        "description": "One or many ID provided are not valid ObjectId, they must be 12-byte input or a 24-character hex string."},
+    200: {
+        "description": "Recent publications returned.",
+        "content": {
+            "application/json": {
+                "example": {
+                    "87639a2738b16f89": 313,
+                    "876398273e916489": 3,
+                }
             }
-        db_res = mongodb_interface.get_one_publication(publication_id=_id)
-        if db_res is None:
-            continue
-        else:
-            response_list[_id] = db_res["likes_count"]
+        }
+    }
+}
+
+
+async def get_publications_likes(id_list: list[str], response: Response):
+    if not all(ObjectId.is_valid(_id) for _id in id_list):
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return {
+            "message": "One or many ID provided are not valid ObjectId, they must be 12-byte input or a 24-character hex string."
+        }
     response.status_code = status.HTTP_200_OK
-    return response_list
+    return await mongodb_interface.get_publications_likes(id_list)
+
+
+@app.get("/trend_tracker_get_many_publications", responses=trend_tracker_many_publications_responses)
+async def get_many_publications_ids_and_likes(id_list_str: str, response: Response):
+    return await get_publications_likes(id_list_str.split(','), response)
+
+
+@app.post("/trend_tracker_get_many_publications", responses=trend_tracker_many_publications_responses)
+async def post_many_publications_ids_and_likes(ids: utils.IdListModel, response: Response):
+    return await get_publications_likes(ids.id_list, response)
+
+
+async def fetch_new_best_publications() -> list[dict]:
+    """Ask TrendTracker for the best ids and resolve them, skipping publications that no longer exist"""
+    get = await trendtracker_client.get(TRENDTRACKER_BL_ENDPOINT)
+    if get.status_code == 204:
+        return []
+    elif get.status_code != 200:
+        raise Exception(f"TrendTracker answered {get.status_code}")
+    ids = [_id for _id in get.json()["new_best_ids"] if ObjectId.is_valid(_id)]
+    return await mongodb_interface.get_publications(ids)
+
+
+new_best_publications = StaleWhileRevalidate(fetch_new_best_publications, ttl=BEST_PUBLICATIONS_TTL)
 
 
 @app.get("/new_best_publications",
          responses={
              503: {
-                 "description": "Error while requesting new best publications."},
+                 "description": "Error while requesting new best publications, and no previous list to serve."},
              204: {"description": "No new publications available."},
              200: {
                  "description": "New best publications returned.",
@@ -661,29 +1208,22 @@ async def get_many_publications_ids_and_likes(id_list_str: str, response: Respon
          )
 async def get_new_best_publications_list(response: Response):
     try:
-        get = requests.get(TRENDTRACKER_URL + ':' + TRENDTRACKER_PORT + TRENDTRACKER_BL_ENDPOINT)
-        if get.status_code == 200:
-            response.status_code = status.HTTP_200_OK
-            result = []
-            for _id in json.loads(get.text)["new_best_ids"]:
-                pub = mongodb_interface.get_one_publication(_id)
-                result.append(utils.stringify_ids(pub))
-            return {
-                "best_new": result
-            }
-
-        elif get.status_code == 204:
-            response.status_code = status.HTTP_204_NO_CONTENT
-            return {
-                "message": "No new publications available."
-            }
-        else:
-            raise Exception()
-    except Exception:
+        result = await new_best_publications.get()
+    except Exception as e:
+        logger.error("New best publications unavailable: %r", e)
         response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
         return {
             "message": "Error while requesting new best publications."
         }
+    if result:
+        return utils.MongoJSONResponse({
+            "best_new": result
+        })
+    else:
+        response.status_code = status.HTTP_204_NO_CONTENT
+        return {
+            "message": "No new publications available."
+        }
 
 
 @app.get("/is/{publication_id}/liked_by/{user}")
@@ -694,68 +1234,167 @@ async def is_publication_liked(publication_id: str, user: str, response: Respons
             "message": "One or many ID provided are not valid ObjectId, they must be 12-byte input or a 24-character "
                        "hex string. "
         }
-    is_liked = mongodb_interface.is_liked(publication_id, user)
+    is_liked = await mongodb_interface.is_liked(publication_id, user)
     response.status_code = 200
     return {
         "is_liked": is_liked
     }
 
 
-@app.get("/{user}/liked_publications")
-async def is_publication_liked(user: str, response: Response):
-    publications = mongodb_interface.get_liked_pub(user)
-    formatted_publications = []
-    for publication in publications:
-        formatted_publications.append(utils.stringify_ids(publication))
-    response.status_code = 200
-    return {
-        "liked_pub": formatted_publications
-    }
-
-
-@app.post("/upload-nft/{wallet}")
-async def upload_image(wallet: str, file: UploadFile):
+@app.get("/{user}/liked_publications", responses=page_responses)
+async def is_publication_liked(user: str, request: Request, response: Response, cursor: str = None,
+                               limit: int = Query(None, ge=1, le=MAX_PAGE_SIZE)):
+    try:
+        after, limit, stream = read_page(request, cursor, limit)
+    except ValueError:
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return {
+            "message": "Invalid cursor"
+        }
+    publications = await mongodb_interface.get_liked_pub(user, after=after, limit=limit)
+    if stream:
+        return StreamingResponse(utils.stream_ndjson(publications, limit), media_type=utils.NDJSON_MEDIA_TYPE)
+    publications = await mongodb_interface.to_list(publications)
+    return utils.MongoJSONResponse({
+        "liked_pub": publications,
+        "next_cursor": utils.next_cursor(publications, limit)
+    })
+
+
+mint_job_example = {
+    "_id": "6368f1ba2c1e4b8f9c7d0a32", "file_id": "6368f1ba2c1e4b8f9c7d0a30", "wallet": "0x0",
+    "status": "pending", "attempts": 1, "last_error": "503: Service Unavailable", "mint_response": None,
+    "created_at": "2022-11-07T12:00:00", "updated_at": "2022-11-07T12:00:01", "minted_at": None,
+    "next_attempt_at": "2022-11-07T12:00:06"
+}
+
+
+@app.post("/upload-nft/{wallet}",
+          status_code=status.HTTP_202_ACCEPTED,
+          responses={
+              400: {"description": "Only jpeg files are supported."},
+              413: {"description": "File too large."},
+              202: {
+                  "description": "Image stored and its mint queued, follow it with GET /mint_jobs/{job_id}.",
+                  "content": {
+                      "application/json": {
+                          "example": {"filename": "nft.jpg", "file_id": mint_job_example["file_id"],
+                                      "job_id": mint_job_example["_id"]}
+                      }
+                  }
+              }
+          })
+async def upload_image(wallet: str, file: UploadFile, response: Response, background_tasks: BackgroundTasks):
     allowed_files = {"image/jpeg"}  # "image/png", "image/gif", "image/tiff", "image/bmp", "video/webm"
     if file.content_type in allowed_files:
-        file_id = str(mongodb_interface.upload_nft(file.file.read(), wallet))
-        resu = requests.post(NFT_URL + ':' + NFT_PORT + "/mint", json={
-            "name": "OsirisNFT",
-            "description": "NiceNFT",
-            "file_url": f"http://169.51.204.107/api/images/{file_id}",
-            "address": wallet
-        })
-        if resu.status_code == 200:
-            print(f"{datetime.datetime.now()}: NFT {file_id} minted, response :{resu.text}")
-            mongodb_interface.nft_set_metadata(metadata=json.loads(resu.text), file_id=file_id, wallet=wallet)
-        else:
-            print(f"NFT {file_id} failed with response {resu.text}")
-
+        try:
+            file_id = str(await mongodb_interface.upload_nft(file.file, wallet, max_size=MAX_UPLOAD_SIZE))
+        except FileTooLargeError:
+            response.status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            return {"message": f"File exceeds {MAX_UPLOAD_SIZE} bytes."}
+        job = await mongodb_interface.create_mint_job(file_id, wallet)
+        mint_worker.notify()
+        background_tasks.add_task(variant_generator.generate_all, ObjectId(file_id))
         return {
             "filename": file.filename,
-            "file_id": file_id
+            "file_id": file_id,
+            "job_id": str(job["_id"])
         }
     else:
-        return "Only jpeg file are supported."
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return {"message": "Only jpeg file are supported."}
+
+
+@app.get("/mint_jobs/{job_id}",
+         responses={
+             400: {"description": "Invalid ID."},
+             404: {"description": "Unknown job, or minted for more than a week."},
+             200: {
+                 "description": "State of a mint: pending (waiting for its first attempt or a retry at "
+                                "`next_attempt_at`), minting, recording (minted, its metadata being written), "
+                                "minted, or dead_lettered after its last failure.",
+                 "content": {
+                     "application/json": {
+                         "example": {"job": mint_job_example}
+                     }
+                 }
+             }
+         })
+async def get_mint_job(job_id: str, response: Response):
+    if not ObjectId.is_valid(job_id):
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return {"message": "Invalid ID"}
+    job = await mongodb_interface.get_mint_job(job_id)
+    if job is None:
+        response.status_code = status.HTTP_404_NOT_FOUND
+        return {"message": "No such mint job"}
+    return utils.MongoJSONResponse({"job": job})
 
 
-@app.get("/get_nft_of/{wallet}")
-async def get_NFTs(wallet: str, response: Response):
-    nfts = mongodb_interface.get_nft_from_wallet(wallet)
+@app.get("/get_nft_of/{wallet}",
+         responses={
+             400: {"description": "The cursor is not a valid file id."},
+             200: {
+                 "description": "One page of the wallet's NFTs, newest first. "
+                                "Pass `next_cursor` as `cursor` to get the next one."
+             }
+         })
+async def get_NFTs(wallet: str, response: Response, cursor: str = None,
+                   limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)):
+    if cursor is not None and not ObjectId.is_valid(cursor):
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return {
+            "message": "Invalid cursor"
+        }
+    nfts = await mongodb_interface.get_nft_from_wallet(
+        wallet, after=ObjectId(cursor) if cursor is not None else None, limit=limit)
     response.status_code = 200
     return {
-        "nfts": nfts
+        "nfts": nfts,
+        "next_cursor": nfts[-1]["_id"] if len(nfts) == limit else None
     }
 
 
+@app.get("/vote_aggregator/metrics")
+async def get_vote_aggregator_metrics(response: Response):
+    if vote_aggregator is None:
+        response.status_code = status.HTTP_404_NOT_FOUND
+        return {"message": "Vote aggregation is disabled."}
+    return vote_aggregator.metrics()
+
+
+@app.get("/publication_cache/metrics")
+async def get_publication_cache_metrics(response: Response):
+    if mongodb_interface.cache is None:
+        response.status_code = status.HTTP_404_NOT_FOUND
+        return {"message": "Publication cache is disabled."}
+    return mongodb_interface.cache.metrics()
+
+
+@app.get("/image_cache/metrics")
+async def get_image_cache_metrics(response: Response):
+    if mongodb_interface.image_cache is None:
+        response.status_code = status.HTTP_404_NOT_FOUND
+        return {"message": "Image cache is disabled."}
+    return mongodb_interface.image_cache.metrics()
+
+
+@app.get("/metrics", response_class=Response,
+         responses={200: {"description": "Metrics of the service in Prometheus text format."}})
+async def get_metrics():
+    body, content_type = metrics.render()
+    return Response(body, headers={"Content-Type": content_type})  # media_type would append a 2nd charset
+
+
 @app.delete("/clean_database")
 async def clean_database():
-    mongodb_interface.clean_database()
+    await mongodb_interface.clean_database()
     return {"massage": "database is now empty."}
 
 
 @app.patch("/update_wallet/{file_id}/{wallet}")
 async def update_wallet(file_id: str, wallet: str, response: Response):
-    mongodb_interface.update_wallet(file_id, wallet)
+    await mongodb_interface.update_wallet(file_id, wallet)
     response.status_code = 200
     return {
         "message": f"{file_id} wallet updated to {wallet}"
@@ -764,7 +1403,7 @@ async def update_wallet(file_id: str, wallet: str, response: Response):
 
 @app.get("/nfts/{file_id}/metadata")
 async def get_metadata(file_id: str, response: Response):
-    nft = mongodb_interface.get_nft_metadata(file_id)
+    nft = await mongodb_interface.get_nft_metadata(file_id)
     response.status_code = 200
     return nft
 
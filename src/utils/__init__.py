@@ -1,3 +1,8 @@
 from .document_builders import *
 from .models import *
 from .data_examples import *
+from .pagination import *
+from .streaming import *
+from .responses import *
+from .upload_limit import *
+from .image_variants import *
@@ -21,38 +21,24 @@ publication_example = {
     "description": "this is the description",
     "hashtags": ["hashtag1", "hashtag2", "hashtag3"],
     "likes_count": 23,
-    "comments": [
-        {
-            "_id": "5bf142459b72e12b2b1b2ce",
-            "user": "bar",
-            "publication_date": "2000-12-31 23: 59: 59.999469",
-            "content": "comment example",
-            "likes_count": 10,
-            "replies": [
-                {
-                    "_id": "5bf142459b72e12b2b1b2c3",
-                    "user": "foo",
-                    "publication_date": "2001-11-30 20: 10: 42.442765",
-                    "target_user": "bar",
-                    "content": "reply example",
-                    "likes_count": 2
-                }
-            ]
-        }
-    ]
+    "comments_count": 1
 }
 
 comment_example = {
     "_id": "5bf142459b72e12b2b1b2cd",
+    "publication_id": "5bf142459b72e12b2b1b2cd",
+    "parent_id": None,
     "user": "foo",
     "publication_date": "1999-12-31 23:59:59.999999",
     "content": "comment example",
     "likes_count": 0,
-    "replies": []
+    "replies_count": 0
 }
 
 reply_example = {
     "_id": "5bf142459b72e12b2b1b2cd",
+    "publication_id": "5bf142459b72e12b2b1b2cd",
+    "parent_id": "5bf142459b72e12b2b1b2ce",
     "user": "foo",
     "target_user": "bar",
     "publication_date": "1999-12-31 23:59:59.999999",
@@ -1,5 +1,6 @@
 from datetime import datetime
 from bson import ObjectId
+import string
 
 
 def build_comment(comment: dict) -> dict:
@@ -8,7 +9,7 @@ def build_comment(comment: dict) -> dict:
     comment["publication_date"] = datetime.now()
     comment["_id"] = ObjectId()
     comment["likes_count"] = 0
-    comment["replies"] = []
+    comment["replies_count"] = 0
     return comment
 
 
@@ -27,24 +28,21 @@ def build_publication(publication: dict) -> dict:
     publication["publication_date"] = datetime.now()
     publication["_id"] = ObjectId()
     publication["likes_count"] = 0
-    publication["comments"] = []
+    publication["comments_count"] = 0
     return publication
 
 
-def stringify_ids(publication: dict) -> dict:
-    """Stringify every ObjectId() of a mongoDB's publication"""
-    publication['_id'] = str(publication['_id'])
-    for x in range(len(publication["comments"])):
-        publication['comments'][x]['_id'] = str(
-            publication['comments'][x]['_id'])
-        for y in range(len(publication['comments'][x]['replies'])):
-            publication['comments'][x]['replies'][y]['_id'] = str(
-                publication['comments'][x]['replies'][y]['_id'])
-    return publication
+def normalize_hashtag(tag: str) -> str:
+    """'#Cats!' and 'cats' are the same hashtag: 'cats'"""
+    return tag.lstrip('#').rstrip(string.punctuation).lower()
 
 
-def get_hashtags(string: str) -> list:
-    str_list = string.split(' ')
-    hashtags = [wrd.strip('#')
-                for wrd in str_list if wrd.lower().startswith('#')]
+def get_hashtags(text: str) -> list:
+    """Normalized hashtags of a text, without duplicates, in order of appearance"""
+    hashtags = []
+    for word in text.split():
+        if word.startswith('#'):
+            hashtag = normalize_hashtag(word)
+            if hashtag and hashtag not in hashtags:
+                hashtags.append(hashtag)
     return hashtags
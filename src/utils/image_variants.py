@@ -0,0 +1,26 @@
+import io
+
+from PIL import Image, ImageOps
+
+# Longest side in pixels of the previews served by /images/{file_id}?size=
+IMAGE_VARIANTS = {
+    "small": 160,
+    "medium": 480,
+    "large": 1080
+}
+VARIANT_QUALITY = 80
+
+
+def resize_image(data: bytes, max_side: int, quality: int = VARIANT_QUALITY) -> bytes:
+    """JPEG of the image `data` scaled down to fit a `max_side` square, keeping its aspect ratio.
+
+    CPU-bound: it runs in the process pool of ImageVariants, hence a plain function of bytes.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)  # the EXIF orientation is not kept by the JPEG encoder
+        image.thumbnail((max_side, max_side))  # never enlarges
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        output = io.BytesIO()
+        image.save(output, "JPEG", quality=quality, optimize=True, progressive=True)
+    return output.getvalue()
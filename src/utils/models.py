@@ -22,3 +22,7 @@ class ReplyModel(BaseModel):
     user: str
     target_user: str
     content: str
+
+
+class IdListModel(BaseModel):
+    id_list: list[str]
@@ -0,0 +1,31 @@
+import base64
+from datetime import datetime
+from bson import ObjectId
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def encode_cursor(publication: dict) -> str:
+    """Opaque keyset cursor pointing right after a publication in (publication_date, _id) descending order"""
+    key = f"{publication['publication_date'].isoformat()}|{publication['_id']}"
+    return base64.urlsafe_b64encode(key.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, ObjectId]:
+    """Inverse of encode_cursor, raise ValueError on a malformed cursor"""
+    try:
+        date, _, _id = base64.urlsafe_b64decode(cursor.encode()).decode().partition("|")
+        return datetime.fromisoformat(date), ObjectId(_id)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+def next_cursor(page: list[dict], limit: int or None) -> str or None:
+    """Cursor of the following page, None when this page is the last one"""
+    if limit is None or len(page) < limit:
+        return None
+    return encode_cursor(page[-1])
+
+
+def accepts_ndjson(accept_header: str or None) -> bool:
+    return accept_header is not None and NDJSON_MEDIA_TYPE in accept_header
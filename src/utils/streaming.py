@@ -0,0 +1,86 @@
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator
+from bson import ObjectId
+import orjson
+
+from .pagination import encode_cursor
+
+
+def stream_likes(publications: Iterable[dict]) -> Iterator[bytes]:
+    """Encode {"<publication_id>": likes_count, ...} one publication at a time from a projected cursor"""
+    separator = b"{"
+    for publication in publications:
+        yield separator + b'"%s":%d' % (str(publication["_id"]).encode(), publication["likes_count"])
+        separator = b","
+    yield b"{}" if separator == b"{" else b"}"
+
+
+def parse_range(range_header: str, length: int) -> tuple[int, int] or None:
+    """Parse a single "bytes=start-end" Range header into inclusive bounds.
+
+    Return None when the header should be ignored (absent, other unit, multiple ranges)
+    and raise ValueError when the range cannot be satisfied.
+    """
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+    start_str, _, end_str = range_header[len("bytes="):].strip().partition("-")
+    try:
+        if start_str == "":  # suffix range: the last N bytes
+            suffix = int(end_str)
+            if suffix <= 0:
+                raise ValueError("Empty suffix range")
+            return max(length - suffix, 0), length - 1
+        start = int(start_str)
+        end = int(end_str) if end_str else length - 1
+    except ValueError:
+        raise ValueError(f"Malformed range: {range_header}")
+    if start >= length or end < start:
+        raise ValueError(f"Unsatisfiable range: {range_header}")
+    return start, min(end, length - 1)
+
+
+def gridfs_chunks(grid_out, start: int, end: int) -> Iterator[bytes]:
+    """Yield the bytes [start, end] of a GridOut one stored chunk at a time"""
+    grid_out.seek(start)
+    remaining = end - start + 1
+    while remaining > 0:
+        chunk = grid_out.readchunk()
+        if not chunk:
+            break
+        if len(chunk) > remaining:
+            chunk = chunk[:remaining]
+        remaining -= len(chunk)
+        yield chunk
+
+
+def json_default(value):
+    """orjson encodes datetime natively, ObjectId is the only BSON type of our documents left to it"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def stream_ndjson(documents: Iterable[dict], limit: int = None) -> Iterator[bytes]:
+    """Encode documents one JSON line at a time straight from a cursor.
+
+    When the page is full, a last {"next_cursor": ...} line tells the client where to resume.
+    """
+    count = 0
+    last = None
+    for document in documents:
+        yield orjson.dumps(document, default=json_default) + b"\n"
+        count += 1
+        last = document
+    if limit is not None and count == limit:
+        yield orjson.dumps({"next_cursor": encode_cursor(last)}) + b"\n"
+
+
+async def ndjson_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    """Split a streamed NDJSON body into its non-empty lines without reading it all"""
+    buffer = b""
+    async for chunk in chunks:
+        *lines, buffer = (buffer + chunk).split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield buffer
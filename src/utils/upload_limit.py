@@ -0,0 +1,27 @@
+from starlette.responses import PlainTextResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+MULTIPART_OVERHEAD = 16 * 1024  # boundaries and part headers around the file itself
+
+
+class UploadSizeLimitMiddleware:
+    """Reject uploads whose declared Content-Length is malformed or too large before their body is read"""
+
+    def __init__(self, app: ASGIApp, max_size: int, path_prefixes: tuple[str, ...]):
+        self.app = app
+        self.max_size = max_size
+        self.path_prefixes = path_prefixes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and scope["method"] == "POST" and scope["path"].startswith(self.path_prefixes):
+            content_length = dict(scope["headers"]).get(b"content-length")
+            if content_length is not None:
+                if not content_length.isdigit():
+                    response = PlainTextResponse("Invalid Content-Length header.", status_code=400)
+                    await response(scope, receive, send)
+                    return
+                if int(content_length) > self.max_size + MULTIPART_OVERHEAD:
+                    response = PlainTextResponse(f"File exceeds {self.max_size} bytes.", status_code=413)
+                    await response(scope, receive, send)
+                    return
+        await self.app(scope, receive, send)